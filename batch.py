@@ -0,0 +1,142 @@
+# batch.py
+import os
+import signal
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from itertools import islice
+from typing import Any, Iterable, Iterator, List, Optional
+
+import normalizer
+
+RESULT_COLUMNS = ["final_normalized", "score", "decision"]
+
+
+def _init_worker() -> None:
+    # importing normalizer compiles the rule tables and loads the lexicon;
+    # a worker does it once and reuses it for every chunk it receives
+    import normalizer
+    normalizer.english_words.load()
+    # Ctrl-C is the parent's to handle; a worker dying mid-chunk would hang the pool
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def make_pool(workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """Process pool whose workers have the detection tables ready."""
+    return ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1, initializer=_init_worker)
+
+
+def detect_chunk(texts: List[Any], include_steps: bool, long_input: bool = False,
+                 with_version: bool = False) -> List[tuple]:
+    # long_input: texts over normalizer.WINDOW_CHARS are scored in windows (detect_long)
+    # and each row ends with result.windows, 0 for a text scored whole
+    # with_version: each row then ends with the ruleset_version that scored it
+    detect = normalizer.detect_long if long_input else normalizer.detect
+    out = []
+    for text in texts:
+        if not isinstance(text, str):  # None / NaN rows score as empty input
+            text = ""
+        result = detect(text, trace=include_steps)
+        row = (result.text, result.score, result.decision)
+        if include_steps:
+            row += (result.steps,)
+        if long_input:
+            row += (result.windows,)
+        if with_version:
+            row += (result.ruleset_version,)
+        out.append(row)
+    return out
+
+
+def ruleset_version() -> str:
+    """The RuleSet version this process scores with (run it in a pool to ask a worker)."""
+    return normalizer.current_rules().version
+
+
+def _chunks(texts: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    it = iter(texts)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_detect_batch(
+    texts: Iterable[Any],
+    workers: Optional[int] = None,
+    chunksize: int = 256,
+    include_steps: bool = False,
+    pool: Optional[Executor] = None,
+    max_pending: Optional[int] = None,
+) -> Iterator[tuple]:
+    """Yield (normalized, score, decision[, steps]) per text, in input order.
+
+    At most max_pending chunks (default 2 per worker) are in flight at once, so an
+    iterator input is read only as fast as results are consumed.
+    """
+    workers = workers or os.cpu_count() or 1
+    if pool is None and workers == 1:
+        for chunk in _chunks(texts, chunksize):
+            yield from detect_chunk(chunk, include_steps)
+        return
+    if pool is None:
+        with make_pool(workers) as pool:
+            yield from _map_bounded(pool, texts, chunksize, include_steps, max_pending or 2 * workers)
+        return
+    yield from _map_bounded(pool, texts, chunksize, include_steps, max_pending or 2 * workers)
+
+
+def _map_bounded(pool: Executor, texts: Iterable[Any], chunksize: int, include_steps: bool,
+                 max_pending: int) -> Iterator[tuple]:
+    # Executor.map would submit every chunk up front; keep a window of futures instead
+    pending: deque = deque()
+    try:
+        for chunk in _chunks(texts, chunksize):
+            pending.append(pool.submit(detect_chunk, chunk, include_steps))
+            if len(pending) >= max_pending:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def normalize_and_detect_batch(
+    texts: Iterable[Any],
+    workers: Optional[int] = None,
+    chunksize: int = 256,
+    include_steps: bool = False,
+    as_frame: bool = False,
+    pool: Optional[Executor] = None,
+):
+    """Run normalize_and_detect over many texts, spread over a process pool.
+
+    texts may be a list, a pandas Series or any iterator of strings. Results come back
+    in input order: a list of (normalized, score, decision[, steps]) tuples, or with
+    as_frame=True a DataFrame with final_normalized/score/decision columns (plus one
+    column per steps field when include_steps=True), indexed like an input Series.
+    workers defaults to os.cpu_count(); workers=1 runs in-process without a pool.
+    Pass pool= to reuse an executor (see make_pool) across many calls. Use
+    iter_detect_batch to consume results as they arrive.
+    """
+    index = None
+    if hasattr(texts, "to_numpy"):  # pandas Series
+        index = texts.index
+        texts = texts.to_numpy()
+
+    results = list(iter_detect_batch(texts, workers, chunksize, include_steps, pool))
+    if not as_frame:
+        return results
+    return _to_frame(results, include_steps, index)
+
+
+def _to_frame(results: List[tuple], include_steps: bool, index=None):
+    import pandas as pd
+
+    df = pd.DataFrame([r[:3] for r in results], columns=RESULT_COLUMNS, index=index)
+    if include_steps:
+        steps = pd.DataFrame([r[3] for r in results], index=df.index)
+        steps = steps.drop(columns=[c for c in steps.columns if c in ("final_normalized", "final_score", "decision")])
+        df = df.join(steps)
+    return df
@@ -0,0 +1,86 @@
+# bench_alloc.py
+"""Memory and allocation cost of traced vs lean detection.
+
+    python bench_alloc.py
+    python bench_alloc.py --texts 5000           # slow: tracemalloc traces every allocation
+
+For every mode, reports per call the peak memory allocated while it runs and the
+bytes the returned result keeps alive (both via tracemalloc), then under batch load
+the memory retained by a whole batch of results and the time per call. "traced" is
+what every call cost before detect() existed: normalize_and_detect built the steps
+dict even with debug=False.
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+
+import normalizer
+
+DATASET = "data/translated_data_clean_10.parquet"
+
+MODES = {
+    "traced (debug=True)": lambda t: normalizer.normalize_and_detect(t, debug=True),
+    "detect(trace=True)": lambda t: normalizer.detect(t, trace=True),
+    "normalize_and_detect": lambda t: normalizer.normalize_and_detect(t),
+    "detect()": lambda t: normalizer.detect(t),
+    "detect(fast=True)": lambda t: normalizer.detect(t, fast=True),
+}
+
+
+def per_call(fn, texts):
+    """Mean transient peak and mean retained bytes per call."""
+    peak_total = kept_total = 0
+    tracemalloc.start()
+    for text in texts:
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        result = fn(text)
+        current, peak = tracemalloc.get_traced_memory()
+        peak_total += peak - base
+        kept_total += current - base
+        del result
+    tracemalloc.stop()
+    return peak_total / len(texts), kept_total / len(texts)
+
+
+def batch_load(fn, texts):
+    """Bytes retained by all results of one batch, and seconds per call (untraced)."""
+    gc.collect()
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    results = [fn(t) for t in texts]
+    retained = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    del results
+    gc.collect()
+    t = time.perf_counter()
+    for text in texts:
+        fn(text)
+    return retained, (time.perf_counter() - t) / len(texts)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--dataset", default=DATASET)
+    parser.add_argument("--texts", type=int, default=1000, help="texts per measurement")
+    args = parser.parse_args(argv)
+
+    import pandas as pd
+
+    texts = [t if isinstance(t, str) else "" for t in pd.read_parquet(args.dataset, columns=["text"])["text"]]
+    texts = texts[: args.texts]
+    normalizer.english_words.load()
+    for fn in MODES.values():  # warm lazy imports and the lexicon pages
+        fn(texts[0])
+
+    print(f"{len(texts)} texts, mean input {sum(map(len, texts)) / len(texts):.0f} chars")
+    print(f"{'mode':22} {'peak B/call':>12} {'kept B/call':>12} {'batch KB':>10} {'us/call':>9}")
+    for name, fn in MODES.items():
+        peak, kept = per_call(fn, texts)
+        retained, seconds = batch_load(fn, texts)
+        print(f"{name:22} {peak:12.0f} {kept:12.0f} {retained / 1024:10.0f} {seconds * 1e6:9.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# bench_lexicon.py
+"""Compare the memory-mapped lexicon with the set-based one.
+
+    python bench_lexicon.py
+
+Reports load time, resident memory added and lookup cost for hits and misses, and
+checks both answer membership identically on a sample of words.
+"""
+import os
+import random
+import time
+
+from build_lexicon import PACKED_PATH, TEXT_PATH
+from lexicon import Lexicon, MappedLexicon
+
+
+def rss_kb() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+
+
+def bench_lookups(lexicon, words, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        for w in words:
+            w in lexicon  # noqa: B015
+        best = min(best, time.perf_counter() - t)
+    return best / len(words) * 1e9
+
+
+def main() -> None:
+    with open(TEXT_PATH, encoding="utf-8") as f:
+        all_words = f.read().split()
+    rng = random.Random(0)
+    hits = rng.sample(all_words, 20_000)
+    misses = ["".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(3, 10))) + "q"
+              for _ in range(20_000)]
+    del all_words
+
+    rows = []
+    for name, factory, path in (("set", Lexicon, TEXT_PATH), ("mmap", MappedLexicon, PACKED_PATH)):
+        before = rss_kb()
+        t = time.perf_counter()
+        lex = factory(path)
+        lex.load()
+        load_ms = (time.perf_counter() - t) * 1000
+        rows.append((name, lex, load_ms, rss_kb() - before))
+
+    (_, set_lex, *_), (_, mapped, *_) = rows
+    sample = hits + misses
+    assert all((w in set_lex) == (w in mapped) for w in sample), "lexicons disagree"
+
+    print(f"{'lexicon':8} {'load ms':>9} {'+RSS MB':>8} {'hit ns':>8} {'miss ns':>8}  file MB")
+    for name, lex, load_ms, rss in rows:
+        size = os.path.getsize(lex.path) / 1e6
+        print(f"{name:8} {load_ms:9.1f} {rss / 1024:8.1f} {bench_lookups(lex, hits):8.0f} "
+              f"{bench_lookups(lex, misses):8.0f}  {size:.1f}")
+    print("(mmap RSS counts only the pages touched so far; they are shared page cache across processes)")
+
+
+if __name__ == "__main__":
+    main()
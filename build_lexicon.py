@@ -0,0 +1,45 @@
+# build_lexicon.py
+"""Build the English lexicon normalizer uses for its ROT13 decision.
+
+    python build_lexicon.py
+
+Writes data/english_words.txt (one word per line, the readable source) and
+data/english_words.lex (packed hash table that normalizer memory-maps, see
+lexicon.py). Needs nltk and network access once (for nltk.download('words'));
+the generated files are committed so detection workers never touch NLTK or the
+network.
+"""
+import os
+import sys
+
+from lexicon import write_packed
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+TEXT_PATH = os.path.join(DATA_DIR, "english_words.txt")
+PACKED_PATH = os.path.join(DATA_DIR, "english_words.lex")
+
+
+def load_nltk_words() -> list:
+    import nltk
+
+    nltk.download('words', quiet=True)
+    from nltk.corpus import words
+
+    return sorted({w.lower() for w in words.words()})
+
+
+def build(text_path: str = TEXT_PATH, packed_path: str = PACKED_PATH, from_text: bool = False) -> int:
+    if from_text:  # re-pack the committed word list without NLTK
+        with open(text_path, encoding="utf-8") as f:
+            lexicon = f.read().split()
+    else:
+        lexicon = load_nltk_words()
+        with open(text_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lexicon))
+            f.write("\n")
+    return write_packed(lexicon, packed_path)
+
+
+if __name__ == "__main__":
+    from_text = "--from-text" in sys.argv[1:]
+    print(f"{build(from_text=from_text)} words -> {TEXT_PATH}, {PACKED_PATH}")
@@ -0,0 +1,213 @@
+# cascade.py
+"""Tiered detection: the rule engine settles clear cases, classifiers the grey zone.
+
+    python cascade.py --middle data/ngram_model.npz              # evaluate on the parquet
+    python cascade.py --middle data/ngram_model.npz --model arabguard-egyptian-v1-int8 --json
+
+Every text goes through normalizer.detect in fast mode (a BLOCKED decision stops
+early, any other score is exact), or the full pipeline when block_min or safe_max
+is at or above BLOCK_THRESHOLD, where fast mode's lower-bound score would not do.
+Scores <= safe_max are SAFE and scores >= block_min are BLOCKED without further
+work. The band between them goes to the optional middle tier
+(ngram_model.NgramModel, sub-millisecond), which settles everything it is
+confident about (probability outside middle_band); what is left goes to the model
+(model_runtime.Classifier). Each tier gets one batched call per detect_batch().
+Any object with unsafe_probability(texts) -> array works as a tier.
+CascadeDetector.stats() reports which fraction of the traffic each tier settled.
+
+The defaults (safe_max=-1, block_min=BLOCK_THRESHOLD) settle nothing as rules-tier
+SAFE. Measured on the n-gram model's 1000 held-out rows (ngram_model._split) with
+--middle data/ngram_model.npz: safe_max=0 would settle 84.7% of them as SAFE at
+0.48 accuracy (0.51 overall), because a score of 0 only means no rule fired;
+safe_max=-1 sends those rows to the middle tier for 0.85 overall. Rules-tier
+BLOCKED (11.6% of rows) agrees with the labels 0.59 of the time; --block-min 200
+leaves 0.6% there and gives 0.89 overall, but gives up fast mode.
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Sequence, Tuple
+
+import normalizer
+from normalizer import BLOCK_THRESHOLD
+
+TIERS = ("rules_safe", "rules_blocked", "middle", "model", "rules_only")
+
+
+class CascadeDetector:
+    """Rule engine first, then middle and model tiers for rule scores inside (safe_max, block_min).
+
+    A tier sees the pipeline's normalized text if it has input_kind = "normalized"
+    (NgramModel does), otherwise model_input decides: the original "text" (what the
+    transformer classifiers were trained on) or "normalized". The middle tier
+    settles probabilities outside middle_band, and everything when there is no
+    model. Without either, band texts keep the rule engine's decision ("rules_only").
+    """
+
+    def __init__(self, model=None, safe_max: int = -1, block_min: int = BLOCK_THRESHOLD,
+                 model_threshold: float = 0.5, model_input: str = "text", middle=None,
+                 middle_band: Tuple[float, float] = (0.2, 0.8)):
+        if safe_max >= block_min:
+            raise ValueError("safe_max must be below block_min")
+        if model_input not in ("text", "normalized"):
+            raise ValueError("model_input is 'text' or 'normalized'")
+        self.model = model
+        self.safe_max = safe_max
+        self.block_min = block_min
+        self.model_threshold = model_threshold
+        self.model_input = model_input
+        self.middle = middle
+        self.middle_band = middle_band
+        # fast mode stops at BLOCK_THRESHOLD, so its score only decides thresholds below it
+        self._fast = block_min <= BLOCK_THRESHOLD and safe_max < BLOCK_THRESHOLD
+        self._lock = threading.Lock()
+        self._counts: Counter = Counter()
+        self._seconds: Counter = Counter()
+
+    def detect(self, text: str) -> Dict[str, Any]:
+        return self.detect_batch([text])[0]
+
+    def detect_batch(self, texts: Sequence[str]) -> List[Dict[str, Any]]:
+        """One result dict per text: normalized, score, decision, tier and tier probabilities."""
+        t0 = time.perf_counter()
+        results: List[Dict[str, Any]] = []
+        band: List[int] = []
+        for text in texts:
+            if not isinstance(text, str):
+                text = ""
+            rules = normalizer.detect(text, fast=self._fast)
+            score = rules.score
+            result = {"normalized": rules.text, "score": score, "decision": rules.decision,
+                      "tier": None, "middle_probability": None, "model_probability": None}
+            if score >= self.block_min:
+                result["tier"], result["decision"] = "rules_blocked", "BLOCKED"
+            elif score <= self.safe_max:
+                result["tier"], result["decision"] = "rules_safe", "SAFE"
+            elif self.model is None and self.middle is None:
+                result["tier"] = "rules_only"
+            else:
+                band.append(len(results))
+            results.append(result)
+        t1 = time.perf_counter()
+
+        if band and self.middle is not None:
+            low, high = self.middle_band
+            probs = self.middle.unsafe_probability(self._inputs(self.middle, band, texts, results))
+            left = []
+            for i, p in zip(band, probs):
+                p = float(p)
+                results[i]["middle_probability"] = p
+                if self.model is None or p <= low or p >= high:
+                    results[i].update(tier="middle", decision="BLOCKED" if p >= 0.5 else "SAFE")
+                else:
+                    left.append(i)
+            band = left
+        t2 = time.perf_counter()
+
+        if band:
+            probs = self.model.unsafe_probability(self._inputs(self.model, band, texts, results))
+            for i, p in zip(band, probs):
+                p = float(p)
+                results[i].update(tier="model", model_probability=p,
+                                  decision="BLOCKED" if p >= self.model_threshold else "SAFE")
+        t3 = time.perf_counter()
+
+        with self._lock:
+            self._counts.update(r["tier"] for r in results)
+            self._seconds["rules"] += t1 - t0
+            self._seconds["middle"] += t2 - t1
+            self._seconds["model"] += t3 - t2
+        return results
+
+    def _inputs(self, tier, band: List[int], texts: Sequence[str], results: List[Dict[str, Any]]) -> List[str]:
+        if getattr(tier, "input_kind", self.model_input) == "normalized":
+            return [results[i]["normalized"] for i in band]
+        return [texts[i] if isinstance(texts[i], str) else "" for i in band]
+
+    def stats(self) -> Dict[str, Any]:
+        """Texts seen so far, the fraction settled by each tier, and time per stage."""
+        with self._lock:
+            total = sum(self._counts.values())
+            out: Dict[str, Any] = {"texts": total}
+            for tier in TIERS:
+                out[tier] = round(self._counts[tier] / total, 4) if total else 0.0
+            for stage in ("rules", "middle", "model"):
+                out[f"{stage}_seconds"] = round(self._seconds[stage], 3)
+            return out
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self._counts.clear()
+            self._seconds.clear()
+
+
+def evaluate(detector: CascadeDetector, texts: Sequence[str], labels: Sequence[int],
+             batch_size: int = 256) -> Dict[str, Any]:
+    """Tier fractions plus accuracy overall and per tier (label 0 = safe)."""
+    detector.reset_stats()
+    correct: Counter = Counter()
+    seen: Counter = Counter()
+    for start in range(0, len(texts), batch_size):
+        chunk = detector.detect_batch(texts[start:start + batch_size])
+        for r, label in zip(chunk, labels[start:start + batch_size]):
+            seen[r["tier"]] += 1
+            # FLAG counts as not safe, as in the notebooks' binary labels
+            correct[r["tier"]] += int((r["decision"] != "SAFE") == (int(label) != 0))
+    report = detector.stats()
+    report["accuracy"] = round(sum(correct.values()) / max(sum(seen.values()), 1), 4)
+    report["tier_accuracy"] = {t: round(correct[t] / seen[t], 4) for t in TIERS if seen[t]}
+    return report
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--model", default=None, help="classifier checkpoint / exported dir (model_runtime)")
+    parser.add_argument("--middle", default=None, help="n-gram model .npz (ngram_model)")
+    parser.add_argument("--middle-band", type=float, nargs=2, default=(0.2, 0.8), metavar=("LOW", "HIGH"),
+                        help="middle-tier probabilities inside this band go on to --model")
+    parser.add_argument("--dataset", default="data/translated_data_clean_10.parquet")
+    parser.add_argument("--limit", type=int, default=0)
+    parser.add_argument("--safe-max", type=int, default=-1, help="rule scores up to this are SAFE (-1: none)")
+    parser.add_argument("--block-min", type=int, default=BLOCK_THRESHOLD, help="rule scores from this are BLOCKED")
+    parser.add_argument("--threshold", type=float, default=0.5, help="model probability that blocks")
+    parser.add_argument("--model-input", choices=["text", "normalized"], default="text")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+
+    import pandas as pd
+
+    df = pd.read_parquet(args.dataset)
+    if args.limit:
+        df = df.head(args.limit)
+    texts = [t if isinstance(t, str) else "" for t in df["text"]]
+    model = None
+    if args.model:
+        from model_runtime import Classifier
+
+        model = Classifier(args.model)
+    middle = None
+    if args.middle:
+        from ngram_model import NgramModel
+
+        middle = NgramModel.load(args.middle)
+    detector = CascadeDetector(model, args.safe_max, args.block_min, args.threshold, args.model_input,
+                               middle, tuple(args.middle_band))
+    report = evaluate(detector, texts, df["label"].tolist())
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"{report['texts']} texts, accuracy {report['accuracy']}")
+        for tier in TIERS:
+            if report[tier]:
+                print(f"  {tier:14s} {report[tier] * 100:5.1f}% of traffic, "
+                      f"accuracy {report['tier_accuracy'].get(tier, float('nan'))}")
+        print(f"  time: rules {report['rules_seconds']} s, middle {report['middle_seconds']} s, "
+              f"model {report['model_seconds']} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
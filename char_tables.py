@@ -0,0 +1,26 @@
+# char_tables.py
+from typing import Callable, Iterable, Optional
+
+
+class CharTable(dict):
+    """str.translate() table built from a per-character rule.
+
+    The code points passed as preload are computed up front; any other code point
+    is computed the first time it is seen and cached (up to limit entries), so every
+    later lookup is a plain dict hit inside str.translate. The rule returns the
+    replacement string, or None to delete the character.
+    """
+
+    def __init__(self, rule: Callable[[str], Optional[str]], preload: Iterable[int] = (), limit: int = 65_536):
+        super().__init__()
+        self._rule = rule
+        self._limit = limit
+        for cp in preload:
+            self[cp] = rule(chr(cp))
+
+    def __missing__(self, cp: int) -> Optional[str]:
+        value = self._rule(chr(cp))
+        if len(self) < self._limit:  # an input full of distinct rare code points cannot grow it unbounded
+            self[cp] = value
+        return value
+
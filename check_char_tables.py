@@ -0,0 +1,100 @@
+# check_char_tables.py
+"""Parity check and micro-benchmark for the str.translate character tables.
+
+    python check_char_tables.py
+
+Compares aggressive_clean, safe_deobfuscate_token and smart_rot13_decode with
+the regex / per-character versions they replaced, over every Unicode code point
+and over the bundled parquet (whole texts and their tokens), then times old
+against new on ASCII and non-ASCII inputs separately. Exits 1 on any mismatch and
+when a new version is slower than the one it replaced on either kind of input.
+"""
+import re
+import sys
+import time
+
+import pandas as pd
+
+import normalizer as n
+
+DATASET = "data/translated_data_clean_10.parquet"
+
+
+# --- the implementations the tables replaced ---
+def ref_aggressive_clean(text):
+    text = re.sub(r'[^a-zA-Zء-ي0-9\s@\$#\.\,\-\'"]', ' ', text)
+    text = re.sub(r'[ًٌٍَُِْـ]', '', text)
+    text = re.sub(r'\s+', ' ', text).strip()
+    return text.lower()
+
+def ref_deobfuscate_token(token):
+    out = []
+    for ch in token:
+        if ch.isalpha() or ch.isdigit() or ch in '@$§!+':
+            out.append(n.deobfuscate_char(ch))
+        else:
+            out.append(ch)
+    if token and token[0].isupper():
+        return ''.join(out).capitalize()
+    return ''.join(out)
+
+def ref_rot13(t):
+    def rot_char(c):
+        if 'a' <= c <= 'z': return chr((ord(c)-ord('a')+13)%26 + ord('a'))
+        if 'A' <= c <= 'Z': return chr((ord(c)-ord('A')+13)%26 + ord('A'))
+        return c
+    return ''.join(rot_char(c) for c in t)
+
+
+PAIRS = [
+    ("aggressive_clean", ref_aggressive_clean, n.aggressive_clean),
+    ("safe_deobfuscate_token", ref_deobfuscate_token, n.safe_deobfuscate_token),
+    ("smart_rot13_decode", ref_rot13, n.smart_rot13_decode),
+]
+
+
+def bench(fn, inputs, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        for s in inputs:
+            fn(s)
+        best = min(best, time.perf_counter() - t)
+    return best
+
+
+def main() -> int:
+    texts = [t if isinstance(t, str) else "" for t in pd.read_parquet(DATASET)["text"]]
+    tokens = [tok for t in texts for tok in re.findall(r'\b\w+\b|[^\w\s]', t)]
+    every_char = [chr(cp) for cp in range(sys.maxunicode + 1)]
+    cases = {"code points": every_char, "texts": texts, "tokens": tokens}
+
+    failed = False
+    for name, ref, new in PAIRS:
+        for label, inputs in cases.items():
+            bad = [s for s in inputs if ref(s) != new(s)]
+            if bad:
+                failed = True
+                print(f"MISMATCH {name} on {len(bad)} {label}, e.g. {bad[0][:40]!r}: "
+                      f"{ref(bad[0])[:40]!r} != {new(bad[0])[:40]!r}")
+
+    print(f"{len(texts)} texts, {len(tokens)} tokens (best of 3, old -> new)")
+    for name, ref, new in PAIRS:
+        inputs = tokens if name in ("safe_deobfuscate_token", "smart_rot13_decode") else texts
+        for label, part in (("ascii", [s for s in inputs if s.isascii()]),
+                            ("non-ascii", [s for s in inputs if not s.isascii()])):
+            t_ref, t_new = bench(ref, part), bench(new, part)
+            speedup = t_ref / max(t_new, 1e-9)
+            slower = speedup < 1.0
+            failed |= slower
+            print(f"  {name:24s} {label:9s} {t_ref * 1e3:8.1f} ms -> {t_new * 1e3:7.1f} ms"
+                  f"  ({speedup:5.1f}x){'  SLOWER' if slower else ''}")
+    if failed:
+        print("FAIL")
+        return 1
+    print("OK: identical output, no slowdown")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
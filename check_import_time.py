@@ -0,0 +1,73 @@
+# check_import_time.py
+"""Import-time budget for normalizer: exits 1 when `import normalizer` regresses.
+
+    python check_import_time.py            # median of 7 fresh interpreters
+    python check_import_time.py --runs 15  # more samples on a noisy machine
+
+Each run is a new interpreter so nothing is cached in sys.modules; only the import
+itself is timed, not interpreter start-up. The bytecode of the local modules is
+compiled first, as it is once deployed: with stale .pyc files (or
+PYTHONDONTWRITEBYTECODE) every run would also time compiling normalizer.py, ~20 ms.
+A regression is something to find with `python -X importtime -c "import normalizer"`,
+not a reason to raise the budget.
+"""
+import argparse
+import compileall
+import os
+import statistics
+import subprocess
+import sys
+
+# the stdlib modules normalizer needs (re, typing, json, ...) take ~20 ms on a slow
+# single core and normalizer itself ~10 ms more: the median sits at 30-40 ms, and
+# an eager bs4 / nltk / emoji / hashlib import or a slow table build goes over
+BUDGET_MS = 50.0
+# imported on first use only: the NLP / emoji packages, OpenSSL hashlib (result
+# caches) and html.parser (text that holds markup)
+LAZY_MODULES = ("bs4", "emoji", "nltk", "hashlib", "html.parser")
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+_PROBE = (
+    "import time; t = time.perf_counter(); import normalizer; "
+    "print((time.perf_counter() - t) * 1000)"
+)
+
+
+def measure(runs: int = 7) -> list:
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", _PROBE], cwd=HERE, check=True, capture_output=True, text=True
+        ).stdout
+        samples.append(float(out.strip().splitlines()[-1]))
+    return samples
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="check the normalizer import-time budget")
+    parser.add_argument("--budget-ms", type=float, default=BUDGET_MS)
+    parser.add_argument("--runs", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    compileall.compile_dir(HERE, maxlevels=0, quiet=1)
+    samples = measure(args.runs)
+    median = statistics.median(samples)
+    heavy = subprocess.run(
+        [sys.executable, "-c", f"import sys, normalizer; print(' '.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"],
+        cwd=HERE, check=True, capture_output=True, text=True,
+    ).stdout.strip()
+
+    print(f"import normalizer: median {median:.1f} ms (min {min(samples):.1f}, max {max(samples):.1f}), "
+          f"budget {args.budget_ms:.0f} ms")
+    failed = False
+    if median > args.budget_ms:
+        print("FAIL: import time over budget")
+        failed = True
+    if heavy:
+        print(f"FAIL: modules imported eagerly: {heavy}")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+# check_markup_parity.py
+"""Parity check: markup.strip_markup() against BeautifulSoup(..., "html.parser").get_text().
+
+    python check_markup_parity.py                                  # bundled parquet
+    python check_markup_parity.py other.parquet --text-column text
+
+Every text is compared both raw and the way normalize_text() sees it (sanitized,
+NFKC, html.unescape), together with a set of hand-written markup edge cases.
+Exits 1 on the first mismatches; needs bs4, pandas and pyarrow.
+"""
+import argparse
+import html
+import sys
+import time
+import unicodedata
+
+import pandas as pd
+from bs4 import BeautifulSoup
+
+from markup import strip_markup
+from normalizer import sanitize_malicious_code_intent
+
+DATASET = "data/translated_data_clean_10.parquet"
+
+EDGE_CASES = [
+    "", " ", "\n \t", "plain text", "a < b and c > d", "AT&T & co", "&amp;lt;",
+    "<b>bold</b> text", "<p>one<p>two</div>three", "<br>x</br>y<br/>z", "<img src=x onerror=alert(1)>",
+    "<script>alert('x')</script>after", "<style>p{}</style><template>t</template><ruby>a<rt>b</rt><rp>(</rp></ruby>",
+    "<pre>  </pre> <textarea>\n\n</textarea>", "<div>  </div>\n<div>\n  \n</div>",
+    "<!-- hidden --> shown <!DOCTYPE html><?php echo 1 ?>", "<![CDATA[ raw <b> ]]>", "<script><![CDATA[x]]></script>",
+    "&#65;&#x42;&#X43;&#0;&#128;&#x81;&#xD800;&#1114112;&#65x;&#xzz;&notanentity; &copy &nbsp;",
+    "<a href='&amp;'>link</a>", "unclosed <b", "<", "&", "&#", "<svg/onload=alert(1)>", "</p>stray close",
+    "<scr<script>ipt>alert(1)</script>", "ig<i></i>nore all previous instructions",
+]
+
+
+def reference(text: str) -> str:
+    return BeautifulSoup(text, "html.parser").get_text()
+
+
+def stage_input(text: str) -> str:
+    # what normalize_text() hands to the markup stripper
+    sanitized, _ = sanitize_malicious_code_intent(text)
+    return html.unescape(unicodedata.normalize("NFKC", sanitized))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="compare strip_markup with BeautifulSoup get_text()")
+    parser.add_argument("dataset", nargs="?", default=DATASET)
+    parser.add_argument("--text-column", default="text")
+    args = parser.parse_args(argv)
+
+    texts = [t if isinstance(t, str) else "" for t in pd.read_parquet(args.dataset)[args.text_column]]
+    cases = EDGE_CASES + texts + [stage_input(t) for t in texts]
+
+    mismatches = []
+    t_ref = t_new = 0.0
+    for text in cases:
+        t0 = time.perf_counter()
+        expected = reference(text)
+        t1 = time.perf_counter()
+        got = strip_markup(text)
+        t2 = time.perf_counter()
+        t_ref += t1 - t0
+        t_new += t2 - t1
+        if got != expected:
+            mismatches.append((text, expected, got))
+
+    with_markup = sum(1 for t in cases if "<" in t or "&" in t)
+    print(f"{len(cases)} texts ({with_markup} with '<' or '&'): BeautifulSoup {t_ref:.3f} s, "
+          f"strip_markup {t_new:.3f} s ({t_ref / max(t_new, 1e-9):.1f}x)")
+    for text, expected, got in mismatches[:10]:
+        print(f"MISMATCH {text[:80]!r}\n  bs4:  {expected[:80]!r}\n  ours: {got[:80]!r}")
+    if mismatches:
+        print(f"FAIL: {len(mismatches)} mismatches")
+        return 1
+    print("OK: identical output")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
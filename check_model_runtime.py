@@ -0,0 +1,72 @@
+# check_model_runtime.py
+"""Unit checks for model_runtime's batching helpers; no model or torch needed.
+
+    python check_model_runtime.py
+
+length_buckets must cover every index once, keep each batch within batch_size
+and max_tokens (a lone text longer than max_tokens still gets a batch), and group
+by length. pad_batch must left-align each row, mask exactly its tokens and round
+the width up to `multiple` unless length= fixes it. Exits 1 on any mismatch.
+"""
+import sys
+
+import numpy as np
+
+from model_runtime import length_buckets, pad_batch
+
+
+def check_length_buckets(failures: list) -> None:
+    lengths = [5, 40, 3, 12, 40, 7, 300, 1, 12, 9]
+    batches = length_buckets(lengths, batch_size=3, max_tokens=64)
+    flat = [i for batch in batches for i in batch]
+    if sorted(flat) != list(range(len(lengths))):
+        failures.append(f"length_buckets: indices {flat} are not each index once")
+    if [lengths[i] for i in flat] != sorted(lengths):
+        failures.append(f"length_buckets: batches {batches} are not in length order")
+    for batch in batches:
+        longest = max(lengths[i] for i in batch)
+        if len(batch) > 3 or (len(batch) > 1 and longest * len(batch) > 64):
+            failures.append(f"length_buckets: batch {batch} breaks batch_size 3 / max_tokens 64")
+    if [6] not in batches:
+        failures.append(f"length_buckets: the 300-token text is not alone in {batches}")
+    want = [[7, 2, 0], [5, 9, 3], [8], [1], [4], [6]]
+    if batches != want:
+        failures.append(f"length_buckets: {batches}, want {want}")
+    if length_buckets([], 8, 64) != []:
+        failures.append("length_buckets: no texts should give no batches")
+
+
+def check_pad_batch(failures: list) -> None:
+    ids = [[101, 7, 8, 102], [101, 102], [101, 5, 6, 7, 8, 9, 102]]
+    out = pad_batch(ids, pad_id=0, multiple=8)
+    want_ids = np.array([[101, 7, 8, 102, 0, 0, 0, 0],
+                         [101, 102, 0, 0, 0, 0, 0, 0],
+                         [101, 5, 6, 7, 8, 9, 102, 0]], dtype=np.int64)
+    if sorted(out) != ["attention_mask", "input_ids", "token_type_ids"]:
+        failures.append(f"pad_batch: keys {sorted(out)}")
+    if not np.array_equal(out["input_ids"], want_ids) or out["input_ids"].dtype != np.int64:
+        failures.append(f"pad_batch: input_ids\n{out['input_ids']}")
+    if not np.array_equal(out["attention_mask"], (want_ids != 0).astype(np.int64)):
+        failures.append(f"pad_batch: attention_mask\n{out['attention_mask']}")
+    if out["token_type_ids"].any() or out["token_type_ids"].shape != want_ids.shape:
+        failures.append("pad_batch: token_type_ids should be zeros of the same shape")
+    if pad_batch(ids, pad_id=0, multiple=1)["input_ids"].shape != (3, 7):
+        failures.append("pad_batch: multiple=1 should pad to the longest row only")
+    fixed = pad_batch(ids, pad_id=1, length=10)
+    if fixed["input_ids"].shape != (3, 10) or fixed["input_ids"][1, 2:].tolist() != [1] * 8:
+        failures.append(f"pad_batch: length=10 with pad_id 1\n{fixed['input_ids']}")
+
+
+def main() -> int:
+    failures: list = []
+    check_length_buckets(failures)
+    check_pad_batch(failures)
+    if failures:
+        print("\n".join(failures))
+        return 1
+    print("OK: length_buckets and pad_batch")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
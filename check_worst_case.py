@@ -0,0 +1,118 @@
+# check_worst_case.py
+"""Latency ceiling for adversarial inputs: exits 1 when any case takes too long.
+
+    python check_worst_case.py                    # every case at ~20 KB, long mode at ~200 KB
+    python check_worst_case.py --size 100000 --ceiling-ms 1000
+
+Each case is a repetitive input built to hit a rule's worst behaviour (repeated
+redactions, unbounded regex gaps, unterminated markup, ...). Cases run through the
+function they target and through the full pipeline (detect); the long-input cases
+run detect_long on --long-factor times the size, against the same factor times the
+ceiling, which holds only while the cost stays linear. The best of --runs calls is
+compared with the ceiling, so one scheduler hiccup does not fail the check.
+"""
+import argparse
+import sys
+import time
+
+import normalizer
+from markup import strip_markup
+
+SIZE = 20000
+CEILING_MS = 250.0
+LONG_FACTOR = 10
+
+# name -> repeated unit; every case also runs through detect() / detect_long()
+UNITS = {
+    "evil call": "exploit( ",
+    "data leak": "console.log(secret) ",
+    "open console.log": "console.log( ",
+    "loop without body": "while(true) ",
+    "prompt without system": "prompt ",
+    "function ignore": "function ignore ",
+    "divulge": "divulge ",
+    "hidden gap": "hidden" + " " * 30,
+    "split letters": "a ",
+    "split letters + word": "a b bb ",
+    "long repeats": "aaab",
+    "jailbreak": "developer mode ",
+    "open tag": "<a ",
+    "open attribute": "<a b=",
+    "open end tag": "</a ",
+    "open comment": "<!--",
+    "open cdata": "<![CDATA[",
+    "hex run": "0123456789abcdef",
+    "base64 run": "QUJD",
+    "url escapes": "%41",
+    "unicode escapes": "\\u0041",
+    "nested base64": "WVVKRA==",
+    "arabic trigger": "تجاهل التعليمات ",
+}
+
+# name -> (function under test, unit); the stage a case targets, on its own
+STAGE_CASES = {
+    "sanitize: repeated evil call": (normalizer.sanitize_malicious_code_intent, "exploit( "),
+    "sanitize: repeated data leak": (normalizer.sanitize_malicious_code_intent, "console.log(secret) "),
+    "code patterns: function ignore": (normalizer.analyze_code_patterns, "function ignore "),
+    "code patterns: open console.log": (normalizer.analyze_code_patterns, "console.log( "),
+    "code patterns: prompt": (normalizer.analyze_code_patterns, "prompt "),
+    "markup: open tag": (strip_markup, "<a "),
+    "markup: open end tag": (strip_markup, "</a "),
+    "split letters": (normalizer.merge_split_letters, "a "),
+}
+
+
+def repeat(unit: str, size: int) -> str:
+    return unit * max(size // len(unit), 1)
+
+
+def best_of(fn, text: str, runs: int) -> float:
+    best = float("inf")
+    for _ in range(runs):
+        t = time.perf_counter()
+        fn(text)
+        best = min(best, time.perf_counter() - t)
+    return best
+
+
+def cases(size: int, long_factor: int):
+    """(name, function, text, ceiling factor) for every check."""
+    for name, (fn, unit) in STAGE_CASES.items():
+        yield name, fn, repeat(unit, size), 1
+    for name, unit in UNITS.items():
+        yield f"detect: {name}", normalizer.detect, repeat(unit, size), 1
+    for name, unit in UNITS.items():
+        yield f"detect_long: {name}", normalizer.detect_long, repeat(unit, size * long_factor), long_factor
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--size", type=int, default=SIZE, help="input length in characters")
+    parser.add_argument("--ceiling-ms", type=float, default=CEILING_MS, help="per call at --size")
+    parser.add_argument("--long-factor", type=int, default=LONG_FACTOR,
+                        help="detect_long inputs are this many times --size (0 skips them)")
+    parser.add_argument("--runs", type=int, default=2)
+    args = parser.parse_args(argv)
+
+    normalizer.english_words.load()
+    normalizer.normalize_and_detect("warm up")  # first call imports emoji
+
+    failed = []
+    for name, fn, text, factor in cases(args.size, args.long_factor):
+        if not factor:
+            continue
+        ceiling = args.ceiling_ms * factor
+        ms = best_of(fn, text, args.runs) * 1e3
+        over = ms > ceiling
+        print(f"{name:40s} {len(text):8d} chars {ms:9.1f} ms / {ceiling:6.0f}{'  OVER' if over else ''}")
+        if over:
+            failed.append(name)
+    if failed:
+        print(f"FAIL: {len(failed)} case(s) over the ceiling")
+        return 1
+    print("OK: every case under its ceiling")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
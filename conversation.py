@@ -0,0 +1,230 @@
+# conversation.py
+"""Conversation-level detection that only scores the newest turn.
+
+    scanner = ConversationScanner(max_sessions=50_000, idle_seconds=1800)
+    scanner = ConversationScanner(policy=Policy("bank", block=90, flag=50))   # a tenant's policy
+    turn = scanner.scan(chat_id, message)
+    if turn.blocked:
+        ...                              # the conversation as a whole is over the line
+
+    python conversation.py --turns 200   # cost per turn vs re-scanning the whole history
+
+Multi-turn injections spread a payload over messages ("i g n o" then "r e", an
+Arabic trigger cut in two). Re-scanning the concatenated history every turn is
+quadratic over a chat. Per session this keeps only the last `overlap` characters of
+the conversation with their cached score and rule hits, the Arabic automaton state
+and a decaying score. A new message is scored on its own; a seam window (cached
+tail + the message's first `overlap` chars) adds whatever matches only across the
+boundary, and the Arabic automaton, resumed where the last turn left it, adds
+triggers cut between turns. The conversation score is
+
+    score = min(previous score * decay + turn score, policy.cap)
+
+so one strong turn blocks at once, and weak turns only add up while they keep
+coming. Sessions live in an LRU: past max_sessions the least recently used one is
+dropped, and sessions idle longer than idle_seconds are dropped on the next scan.
+Each turn is scored with one RuleSet; when normalizer.reload_rules() swaps in a new
+one, a session's cached tail is re-scored and its Arabic automaton restarts. The
+scanner's policy works as in detect(): its weights apply to that RuleSet (a variant
+kept by a detector.Detector) and its cap and thresholds decide the running score.
+"""
+import argparse
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import normalizer
+from detector import Detector
+from normalizer import DEFAULT_POLICY, DetectionResult, Policy, RuleSet
+
+OVERLAP = 256
+DECAY = 0.5
+
+
+class TurnResult:
+    """Outcome of one ConversationScanner.scan() call.
+
+    result is the message scored on its own (detect_long), boundary_hits the rule ids
+    found only across the boundary with earlier turns, turn_score the message's score
+    plus those, and score / decision the conversation's decayed running total.
+    """
+    __slots__ = ("result", "boundary_hits", "turn_score", "score", "decision", "turn")
+
+    def __init__(self, result: DetectionResult, boundary_hits: Tuple[str, ...], turn_score: int,
+                 score: int, decision: str, turn: int):
+        self.result = result
+        self.boundary_hits = boundary_hits
+        self.turn_score = turn_score
+        self.score = score
+        self.decision = decision
+        self.turn = turn
+
+    @property
+    def blocked(self) -> bool:
+        return self.decision == "BLOCKED"
+
+    def __repr__(self) -> str:
+        return (f"TurnResult(turn={self.turn}, decision={self.decision!r}, score={self.score}, "
+                f"turn_score={self.turn_score}, boundary_hits={self.boundary_hits!r})")
+
+
+class _Session:
+    # everything kept between turns; bounded by `overlap` whatever the chat length
+    __slots__ = ("rules", "tail", "tail_score", "tail_hits", "arabic_state", "score", "turns", "last_seen")
+
+    def __init__(self):
+        self.rules: Optional[RuleSet] = None  # what tail_* and arabic_state were computed with
+        self.tail = ""
+        self.tail_score = 0
+        self.tail_hits: frozenset = frozenset()
+        self.arabic_state = 0
+        self.score = 0.0
+        self.turns = 0
+        self.last_seen = 0.0
+
+
+class ConversationScanner:
+    """Per-conversation running scores over an LRU of sessions. Thread-safe.
+
+    Turns of all sessions are scored under one lock, so turns of one conversation
+    are applied in the order scan() is called. rules pins a RuleSet (default: the
+    current one at each turn) and policy applies to every session.
+    """
+
+    def __init__(self, max_sessions: int = 10_000, idle_seconds: Optional[float] = None,
+                 decay: float = DECAY, overlap: int = OVERLAP, clock=time.monotonic,
+                 rules: Optional[RuleSet] = None, policy: Policy = DEFAULT_POLICY):
+        if max_sessions <= 0:
+            raise ValueError("max_sessions must be positive")
+        if not 0.0 <= decay < 1.0:
+            raise ValueError("decay must be in [0, 1)")
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self.decay = decay
+        self.overlap = overlap
+        self.policy = policy
+        self._detector = Detector(rules)
+        self._clock = clock
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def scan(self, session_id: str, message: str) -> TurnResult:
+        """Score message as the next turn of session_id."""
+        if not isinstance(message, str):
+            message = ""
+        with self._lock:
+            now = self._clock()
+            self._expire(now)
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = _Session()
+                if len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+                    self.evictions += 1
+            else:
+                self._sessions.move_to_end(session_id)
+            session.last_seen = now
+            return self._turn(session, message)
+
+    def score(self, session_id: str) -> int:
+        """Current conversation score (0 for an unknown or evicted session)."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            return min(int(session.score), self.policy.cap) if session is not None else 0
+
+    def end(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _expire(self, now: float) -> None:
+        if self.idle_seconds is None:
+            return
+        # recency order: the idle sessions are all at the front
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if now - session.last_seen <= self.idle_seconds:
+                return
+            self._sessions.popitem(last=False)
+            self.expirations += 1
+
+    def _turn(self, session: _Session, message: str) -> TurnResult:
+        policy = self.policy
+        rules = self._detector.rules_for(policy)
+        if session.rules is not rules:
+            if session.tail:
+                self._cache_tail(session, session.tail, rules, policy)
+            session.rules, session.arabic_state = rules, 0  # states do not carry across automata
+        result = normalizer.detect_long(message, rules=rules, policy=policy)
+        turn_score = result.score
+        boundary: dict = {}
+        if session.tail and message:
+            head = message[:self.overlap]
+            head_result = normalizer.detect(head, rules=rules, policy=policy) if len(head) < len(message) else result
+            seam = normalizer.detect(session.tail + " " + head, rules=rules, policy=policy)
+            turn_score += max(seam.score - session.tail_score - head_result.score, 0)
+            known = session.tail_hits.union(head_result.rule_hits)
+            boundary.update((rule_id, None) for rule_id in seam.rule_hits if rule_id not in known)
+        # triggers cut between turns ("تجا" | "هل"): the automaton resumes mid-word
+        arabic, session.arabic_state = normalizer.scan_arabic_keywords(message, session.arabic_state, rules)
+        split = {phrase for phrase in arabic - normalizer.find_arabic_keywords(message, rules)
+                 if f"arabic:{phrase}" not in boundary}  # the seam already scored it
+        if split:
+            turn_score += normalizer.arabic_trigger_score(split, rules)
+            boundary.update((f"arabic:{phrase}", None) for phrase in sorted(split))
+
+        session.score = min(session.score * self.decay + turn_score, policy.cap)
+        session.turns += 1
+        tail = (session.tail + " " + message)[-self.overlap:] if session.tail else message[-self.overlap:]
+        if tail != session.tail:
+            self._cache_tail(session, tail, rules, policy)
+        score = int(session.score)
+        return TurnResult(result, tuple(boundary), min(turn_score, policy.cap), score, policy.decide(score),
+                          session.turns)
+
+    @staticmethod
+    def _cache_tail(session: _Session, tail: str, rules: RuleSet, policy: Policy) -> None:
+        cached = normalizer.detect(tail, rules=rules, policy=policy)
+        session.tail, session.tail_score, session.tail_hits = tail, cached.score, frozenset(cached.rule_hits)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--dataset", default="data/translated_data_clean_10.parquet")
+    parser.add_argument("--turns", type=int, default=200, help="messages in the simulated chat")
+    args = parser.parse_args(argv)
+
+    import pandas as pd
+
+    texts = [t for t in pd.read_parquet(args.dataset, columns=["text"])["text"] if isinstance(t, str)]
+    chat = texts[: args.turns]
+    normalizer.english_words.load()
+    normalizer.detect("warm up")
+
+    scanner = ConversationScanner()
+    t = time.perf_counter()
+    blocked_at = None
+    for i, message in enumerate(chat):
+        if scanner.scan("chat", message).blocked and blocked_at is None:
+            blocked_at = i + 1
+    incremental = time.perf_counter() - t
+
+    t = time.perf_counter()
+    history = []
+    for message in chat:
+        history.append(message)
+        normalizer.detect("\n".join(history))
+    rescan = time.perf_counter() - t
+    print(f"{len(chat)} turns: incremental {incremental * 1e3 / len(chat):.2f} ms/turn, "
+          f"re-scanning history {rescan * 1e3 / len(chat):.2f} ms/turn; first BLOCKED at turn {blocked_at}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
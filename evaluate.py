@@ -0,0 +1,309 @@
+# evaluate.py
+"""Calibrate rule weights and thresholds on a labeled dataset without re-running the pipeline.
+
+    python evaluate.py build                                  # one pass -> data/rule_counts.parquet
+    python evaluate.py sweep --weight keyword_exact=15:35:5 --weight arabic_trigger=100,130 \\
+        --block 100:140:10 --flag 60:100:10 --max-fpr 0.05 --curves /tmp/curves.json
+
+build runs normalizer.rule_counts() once per row and stores the label plus one count
+column per normalizer.RULE_FEATURES entry as Parquet, tagged with the RuleSet version
+(sweep refuses a cache built by other rules). --verify also runs detect() on every
+row and checks that the counts reproduce its score.
+
+sweep scores every combination of the --weight grids (features not named keep their
+current weight) as min(counts @ weights, SCORE_CAP) in one matrix product per block
+of configurations. Each block / flag threshold pair is then read off cumulative
+per-score histograms, so thousands of configurations take seconds. A grid is
+"start:stop:step" (stop included) or "v1,v2,...". Prints the best configurations by
+--sort next to the current one, with confusion matrices and ROC / PR AUC for the
+best; --curves writes the ROC and PR points of both as JSON.
+"""
+import argparse
+import itertools
+import json
+import sys
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import normalizer
+from normalizer import BLOCK_THRESHOLD, FLAG_THRESHOLD, RULE_FEATURES, SCORE_CAP
+
+DATASET = "data/translated_data_clean_10.parquet"
+CACHE_PATH = "data/rule_counts.parquet"
+# scores held in memory at once (rows x configurations) while sweeping
+BLOCK_ELEMENTS = 5_000_000
+
+
+# -----------------------------
+# build: one pipeline pass
+# -----------------------------
+def count_chunk(texts: List[object], verify: bool = False) -> Tuple[List[List[int]], int]:
+    """Count rows for texts; with verify, also how many of them disagree with detect()."""
+    rules = normalizer.current_rules()
+    weights = normalizer.rule_weights(rules)
+    rows, mismatches = [], 0
+    for text in texts:
+        if not isinstance(text, str):  # None / NaN rows score as empty input
+            text = ""
+        counts = normalizer.rule_counts(text, rules)
+        rows.append([counts[name] for name in RULE_FEATURES])
+        if verify:
+            score = min(sum(weights[name] * n for name, n in counts.items()), SCORE_CAP)
+            mismatches += score != normalizer.detect(text).score
+    return rows, mismatches
+
+
+def build(dataset: str, out: str, text_column: str = "text", label_column: str = "label",
+          limit: int = 0, workers: int = 1, chunksize: int = 256, verify: bool = False) -> int:
+    table = pq.read_table(dataset, columns=[text_column, label_column])
+    if limit:
+        table = table.slice(0, limit)
+    texts = table.column(text_column).to_pylist()
+    chunks = [texts[i:i + chunksize] for i in range(0, len(texts), chunksize)]
+    normalizer.english_words.load()
+    started = time.perf_counter()
+    if workers == 1:
+        parts = [count_chunk(chunk, verify) for chunk in chunks]
+    else:
+        from batch import make_pool
+
+        with make_pool(workers) as pool:
+            parts = list(pool.map(count_chunk, chunks, itertools.repeat(verify)))
+    rows = [row for part, _ in parts for row in part]
+    mismatches = sum(n for _, n in parts)
+    counts = np.array(rows, dtype=np.int32).reshape(len(rows), len(RULE_FEATURES))
+
+    columns = {"label": pa.array(table.column(label_column).to_numpy(zero_copy_only=False).astype(np.int8))}
+    columns.update((name, pa.array(counts[:, j])) for j, name in enumerate(RULE_FEATURES))
+    version = normalizer.current_rules().version
+    metadata = {"ruleset_version": version, "features": json.dumps(RULE_FEATURES),
+                "dataset": dataset}
+    pq.write_table(pa.table(columns).replace_schema_metadata(metadata), out)
+    print(f"{len(rows)} rows in {time.perf_counter() - started:.1f} s -> {out} (rules {version})")
+    if verify:
+        print(f"verify: {mismatches} row(s) where the counts do not reproduce detect()'s score")
+        return 1 if mismatches else 0
+    return 0
+
+
+def load_cache(path: str) -> Tuple[np.ndarray, np.ndarray]:
+    """(counts [rows x RULE_FEATURES], labels as bool) from a build() file."""
+    table = pq.read_table(path)
+    metadata = table.schema.metadata or {}
+    version = metadata.get(b"ruleset_version", b"?").decode()
+    current = normalizer.current_rules().version
+    if version != current or json.loads(metadata.get(b"features", b"[]")) != list(RULE_FEATURES):
+        raise SystemExit(f"{path} was built by rules {version}, these are {current}; "
+                         f"run `python evaluate.py build` again")
+    counts = np.column_stack([table.column(name).to_numpy() for name in RULE_FEATURES]).astype(np.int64)
+    return counts, table.column("label").to_numpy().astype(bool)
+
+
+# -----------------------------
+# sweep: vectorized scoring
+# -----------------------------
+def parse_grid(spec: str) -> List[int]:
+    if ":" in spec:
+        start, stop, step = (int(v) for v in spec.split(":"))
+        if step <= 0:
+            raise ValueError(f"grid step must be positive: {spec}")
+        return list(range(start, stop + 1, step))
+    return [int(v) for v in spec.split(",")]
+
+
+def weight_grid(specs: Sequence[str]) -> np.ndarray:
+    """Every weight vector (rows, in RULE_FEATURES order) the NAME=GRID specs span."""
+    current = normalizer.rule_weights()
+    axes: Dict[str, List[int]] = {}
+    for spec in specs:
+        name, _, grid = spec.partition("=")
+        if name not in current:
+            raise SystemExit(f"unknown rule {name!r}; one of: {', '.join(RULE_FEATURES)}")
+        axes[name] = parse_grid(grid)
+    names = list(axes)
+    rows = []
+    for values in itertools.product(*(axes[name] for name in names)):
+        weights = dict(current, **dict(zip(names, values)))
+        rows.append([weights[name] for name in RULE_FEATURES])
+    return np.array(rows, dtype=np.int64).reshape(-1, len(RULE_FEATURES))
+
+
+def score_histograms(counts: np.ndarray, labels: np.ndarray, weights: np.ndarray,
+                     cap: int = SCORE_CAP) -> Tuple[np.ndarray, np.ndarray]:
+    """Positives / negatives scoring >= t, for every weight row and t in 0..cap+1.
+
+    Both arrays are [configurations x (cap + 2)]; the last column is always 0.
+    """
+    bins = cap + 1
+    pos_ge = np.zeros((len(weights), bins + 1), dtype=np.int64)
+    neg_ge = np.zeros_like(pos_ge)
+    step = max(BLOCK_ELEMENTS // max(len(counts), 1), 1)
+    for lo in range(0, len(weights), step):
+        block = weights[lo:lo + step]
+        scores = np.minimum(counts @ block.T, cap)  # rows x configurations
+        offsets = np.arange(len(block)) * bins
+        for labelled, out in ((labels, pos_ge), (~labels, neg_ge)):
+            hist = np.bincount((scores[labelled] + offsets).ravel(), minlength=len(block) * bins)
+            out[lo:lo + len(block), :bins] = hist.reshape(len(block), bins)[:, ::-1].cumsum(axis=1)[:, ::-1]
+    return pos_ge, neg_ge
+
+
+def auc(pos_ge: np.ndarray, neg_ge: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """ROC AUC and average precision per configuration, from score_histograms()."""
+    P = max(int(pos_ge[0, 0]), 1)
+    N = max(int(neg_ge[0, 0]), 1)
+    # thresholds from cap+1 (nothing positive) down to 0 (everything positive)
+    tpr = pos_ge[:, ::-1] / P
+    fpr = neg_ge[:, ::-1] / N
+    roc = (np.diff(fpr, axis=1) * (tpr[:, 1:] + tpr[:, :-1]) / 2).sum(axis=1)
+    flagged = pos_ge + neg_ge
+    precision = np.divide(pos_ge, flagged, out=np.ones(pos_ge.shape), where=flagged > 0)[:, ::-1]
+    ap = (np.diff(tpr, axis=1) * precision[:, 1:]).sum(axis=1)
+    return roc, ap
+
+
+def sweep(counts: np.ndarray, labels: np.ndarray, weights: np.ndarray, blocks: Sequence[int],
+          flags: Sequence[int], cap: int = SCORE_CAP) -> Dict[str, np.ndarray]:
+    """Metrics for every (weights, block, flag) with flag <= block, as flat arrays."""
+    pos_ge, neg_ge = score_histograms(counts, labels, weights, cap)
+    P, N = max(int(labels.sum()), 1), max(int((~labels).sum()), 1)
+    b = np.minimum(np.asarray(blocks), cap + 1)
+    f = np.minimum(np.asarray(flags), cap + 1)
+    config, bi, fi = np.meshgrid(np.arange(len(weights)), np.arange(len(b)), np.arange(len(f)), indexing="ij")
+    keep = np.asarray(flags)[fi] <= np.asarray(blocks)[bi]
+    config, bi, fi = config[keep], bi[keep], fi[keep]
+    tp, fp = pos_ge[config, b[bi]], neg_ge[config, b[bi]]
+    precision = np.divide(tp, tp + fp, out=np.zeros(len(tp)), where=(tp + fp) > 0)
+    recall = tp / P
+    roc, ap = auc(pos_ge, neg_ge)
+    return {
+        "config": config, "block": np.asarray(blocks)[bi], "flag": np.asarray(flags)[fi],
+        "tp": tp, "fp": fp, "fn": P - tp, "tn": N - fp,
+        "precision": precision, "recall": recall, "fpr": fp / N,
+        "f1": np.divide(2 * precision * recall, precision + recall, out=np.zeros(len(tp)),
+                        where=(precision + recall) > 0),
+        "flag_recall": pos_ge[config, f[fi]] / P, "flag_fpr": neg_ge[config, f[fi]] / N,
+        "roc_auc": roc[config], "pr_auc": ap[config],
+    }
+
+
+def curves(counts: np.ndarray, labels: np.ndarray, weights: np.ndarray, cap: int = SCORE_CAP) -> dict:
+    """ROC and PR points (one per threshold 0..cap+1) for a single weight vector."""
+    pos_ge, neg_ge = score_histograms(counts, labels, weights[None, :], cap)
+    P, N = max(int(labels.sum()), 1), max(int((~labels).sum()), 1)
+    tp, fp = pos_ge[0], neg_ge[0]
+    precision = np.divide(tp, tp + fp, out=np.ones(len(tp)), where=(tp + fp) > 0)
+    return {"threshold": list(range(cap + 2)), "tpr": (tp / P).round(6).tolist(),
+            "fpr": (fp / N).round(6).tolist(), "precision": precision.round(6).tolist()}
+
+
+# -----------------------------
+# reporting
+# -----------------------------
+def confusion(counts: np.ndarray, labels: np.ndarray, weights: np.ndarray, block: int, flag: int) -> str:
+    scores = np.minimum(counts @ weights, SCORE_CAP)
+    decision = np.where(scores >= block, 2, np.where(scores >= flag, 1, 0))
+    lines = [f"{'':12s}{'SAFE':>8s}{'FLAG':>8s}{'BLOCKED':>9s}"]
+    for label, name in ((False, "benign"), (True, "injection")):
+        row = np.bincount(decision[labels == label], minlength=3)
+        lines.append(f"{name:12s}{row[0]:8d}{row[1]:8d}{row[2]:9d}")
+    return "\n".join(lines)
+
+
+def describe(weights: np.ndarray) -> str:
+    current = normalizer.rule_weights()
+    changed = [f"{name}={int(w)}" for name, w in zip(RULE_FEATURES, weights) if w != current[name]]
+    return " ".join(changed) or "current weights"
+
+
+def print_rows(results: Dict[str, np.ndarray], order: np.ndarray, weights: np.ndarray) -> None:
+    print(f"{'block':>5s} {'flag':>4s} {'prec':>6s} {'recall':>6s} {'fpr':>6s} {'f1':>6s} "
+          f"{'flag_r':>6s} {'flag_f':>6s} {'roc':>6s} {'ap':>6s}  weights")
+    for i in order:
+        print(f"{results['block'][i]:5d} {results['flag'][i]:4d} {results['precision'][i]:6.3f} "
+              f"{results['recall'][i]:6.3f} {results['fpr'][i]:6.3f} {results['f1'][i]:6.3f} "
+              f"{results['flag_recall'][i]:6.3f} {results['flag_fpr'][i]:6.3f} "
+              f"{results['roc_auc'][i]:6.3f} {results['pr_auc'][i]:6.3f}  "
+              f"{describe(weights[results['config'][i]])}")
+
+
+def run_sweep(args) -> int:
+    counts, labels = load_cache(args.cache)
+    weights = weight_grid(args.weight)
+    current = np.array([normalizer.rule_weights()[name] for name in RULE_FEATURES], dtype=np.int64)
+    blocks, flags = parse_grid(args.block), parse_grid(args.flag)
+    started = time.perf_counter()
+    results = sweep(counts, labels, weights, blocks, flags)
+    baseline = sweep(counts, labels, current[None, :], [BLOCK_THRESHOLD], [FLAG_THRESHOLD])
+    elapsed = time.perf_counter() - started
+
+    eligible = np.flatnonzero(results["fpr"] <= args.max_fpr)
+    print(f"{len(labels)} rows ({int(labels.sum())} injections), {len(weights)} weight vectors x "
+          f"{len(blocks)} block x {len(flags)} flag thresholds = {len(results['f1'])} configurations "
+          f"in {elapsed:.2f} s; {len(eligible)} with fpr <= {args.max_fpr}")
+    print("\ncurrent:")
+    print_rows(baseline, np.arange(1), current[None, :])
+    if not len(eligible):
+        return 1
+    key = results["recall"] - results["fpr"] if args.sort == "youden" else results[args.sort]
+    order = eligible[np.argsort(-key[eligible], kind="stable")][: args.top]
+    print(f"\nbest {len(order)} by {args.sort}:")
+    print_rows(results, order, weights)
+
+    best = order[0]
+    best_weights = weights[results["config"][best]]
+    print(f"\nbest: {describe(best_weights)}, block {results['block'][best]}, flag {results['flag'][best]}")
+    print(confusion(counts, labels, best_weights, results["block"][best], results["flag"][best]))
+    print("\ncurrent:")
+    print(confusion(counts, labels, current, BLOCK_THRESHOLD, FLAG_THRESHOLD))
+    if args.curves:
+        report = {
+            "ruleset_version": normalizer.current_rules().version,
+            "current": {"weights": dict(zip(RULE_FEATURES, current.tolist())), **curves(counts, labels, current)},
+            "best": {"weights": dict(zip(RULE_FEATURES, best_weights.tolist())),
+                     "block": int(results["block"][best]), "flag": int(results["flag"][best]),
+                     **curves(counts, labels, best_weights)},
+        }
+        with open(args.curves, "w", encoding="utf-8") as f:
+            json.dump(report, f)
+        print(f"\nROC / PR points -> {args.curves}")
+    return 0
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("build", help="run the pipeline once and cache per-row rule counts")
+    p.add_argument("--dataset", default=DATASET)
+    p.add_argument("--cache", default=CACHE_PATH)
+    p.add_argument("--text-column", default="text")
+    p.add_argument("--label-column", default="label")
+    p.add_argument("--limit", type=int, default=0)
+    p.add_argument("--workers", type=int, default=1)
+    p.add_argument("--verify", action="store_true", help="check the counts against detect() per row")
+
+    p = commands.add_parser("sweep", help="score weight / threshold grids from the cache")
+    p.add_argument("--cache", default=CACHE_PATH)
+    p.add_argument("--weight", action="append", default=[], metavar="RULE=GRID",
+                   help=f"one of {', '.join(RULE_FEATURES)}; repeatable")
+    p.add_argument("--block", default=str(BLOCK_THRESHOLD), metavar="GRID")
+    p.add_argument("--flag", default=str(FLAG_THRESHOLD), metavar="GRID")
+    p.add_argument("--sort", choices=("f1", "youden", "precision", "recall"), default="f1")
+    p.add_argument("--max-fpr", type=float, default=1.0, help="only rank configurations at or under this FPR")
+    p.add_argument("--top", type=int, default=10)
+    p.add_argument("--curves", help="write ROC / PR points of the current and best configuration here")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        return build(args.dataset, args.cache, args.text_column, args.label_column, args.limit,
+                     args.workers, verify=args.verify)
+    return run_sweep(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
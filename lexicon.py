@@ -0,0 +1,144 @@
+# lexicon.py
+import mmap
+import struct
+import sys
+from array import array
+from typing import Iterable, Optional
+from zlib import crc32
+
+# Packed lexicon (.lex), little endian:
+#   magic "AGLEX1\0\0" | nslots u32 | nwords u32 | blob_len u32 | pad u32
+#   slots: nslots x u32, open-addressing hash table (crc32, linear probing),
+#          0 = empty, otherwise 1 + offset of the word in blob
+#   blob:  words as <len u8><utf-8 bytes>
+MAGIC = b"AGLEX1\0\0"
+_HEADER = struct.Struct("<8sIIII")
+
+
+def write_packed(words: Iterable[str], path: str) -> int:
+    """Write words to path in the packed format; returns the number of words."""
+    encoded = sorted({w.encode("utf-8") for w in words if w})
+    nslots = 1
+    while nslots < len(encoded) * 2:  # load factor <= 0.5 keeps probe chains short
+        nslots *= 2
+    mask = nslots - 1
+    slots = array("I", bytes(4 * nslots))
+    blob = bytearray()
+    for b in encoded:
+        if len(b) > 255:
+            raise ValueError(f"word longer than 255 bytes: {b[:20]!r}...")
+        i = crc32(b) & mask
+        while slots[i]:
+            i = (i + 1) & mask
+        slots[i] = len(blob) + 1
+        blob.append(len(b))
+        blob += b
+    if sys.byteorder != "little":
+        slots.byteswap()
+    with open(path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, nslots, len(encoded), len(blob), 0))
+        f.write(slots.tobytes())
+        f.write(blob)
+    return len(encoded)
+
+
+class MappedLexicon:
+    """Read-only word set backed by a memory-mapped .lex file.
+
+    The file is mapped, not loaded: every process using the same file shares the
+    same page-cache pages, and nothing is unpickled or refcounted per word. Supports
+    `word in lexicon` like the set it replaces; update() adds a small in-memory
+    overlay of extra words. The file is mapped on the first lookup.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._mm: Optional[mmap.mmap] = None
+        self._slots = None
+        self._mask = 0
+        self._size = 0
+        self._blob_start = 0
+        self._extra: set = set()
+
+    def load(self) -> "MappedLexicon":
+        if self._mm is None:
+            try:
+                with open(self.path, "rb") as f:
+                    mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except FileNotFoundError:
+                raise RuntimeError(f"English lexicon not found at {self.path}; run `python build_lexicon.py`") from None
+            magic, nslots, nwords, _, _ = _HEADER.unpack_from(mm, 0)
+            if magic != MAGIC:
+                raise ValueError(f"{self.path} is not a packed lexicon")
+            start = _HEADER.size
+            slots = memoryview(mm)[start:start + 4 * nslots].cast("I")
+            if sys.byteorder != "little":
+                slots = array("I", slots.tobytes())
+                slots.byteswap()
+            self._slots = slots
+            self._mask = nslots - 1
+            self._size = nwords
+            self._blob_start = start + 4 * nslots
+            self._mm = mm
+        return self
+
+    def update(self, words: Iterable[str]) -> None:
+        self._extra.update(words)
+
+    def __contains__(self, word: str) -> bool:
+        return word in self._extra or self._in_file(word)
+
+    def _in_file(self, word: str) -> bool:
+        if self._mm is None:
+            self.load()
+        b = word.encode("utf-8", "surrogatepass")
+        n = len(b)
+        mm, slots, mask, base = self._mm, self._slots, self._mask, self._blob_start
+        i = crc32(b) & mask
+        while True:
+            off = slots[i]
+            if not off:
+                return False
+            off += base - 1
+            if mm[off] == n and mm[off + 1:off + 1 + n] == b:
+                return True
+            i = (i + 1) & mask
+
+    def __len__(self) -> int:
+        self.load()
+        return self._size + sum(1 for w in self._extra if not self._in_file(w))
+
+
+class Lexicon:
+    """Set-based lexicon read from a one-word-per-line text file on the first lookup.
+
+    Simpler but each process holds its own copy; kept for tooling and as the
+    reference MappedLexicon is benchmarked against.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._words: Optional[set] = None
+        self._extra: set = set()
+
+    def load(self) -> set:
+        if self._words is None:
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    words = set(f.read().split())
+            except FileNotFoundError:
+                raise RuntimeError(f"English lexicon not found at {self.path}; run `python build_lexicon.py`") from None
+            words.update(self._extra)
+            self._words = words
+        return self._words
+
+    def update(self, words: Iterable[str]) -> None:
+        self._extra.update(words)
+        if self._words is not None:
+            self._words.update(words)
+
+    def __contains__(self, word: str) -> bool:
+        return word in (self._words if self._words is not None else self.load())
+
+    def __len__(self) -> int:
+        return len(self.load())
@@ -0,0 +1,176 @@
+# linear_match.py
+"""Linear-time stand-ins for the rule regexes that backtrack on long inputs.
+
+    prompt.+system                              InOrder  (terms on one line, in order)
+    function[^\\n]*ignore[^\\n]*instructions     InOrder
+    console\\.log\\s*\\([^)]*(prompt|...)           UntilClose (needle before the next ")")
+    while\\s*\\(\\s*true\\s*\\)[^{]*\\{[^}]*\\}          Delimited (head, first "{", first "}")
+
+The unbounded gaps in those patterns make `re` retry every start position against
+the rest of the line (or text), which is quadratic or worse on inputs like
+"function ignore " * 5000. Each class here finds the same matches, with the same
+spans, by searching only for the fixed parts and never rescanning a region that
+already failed. They expose the slice of the re.Pattern API the rules use:
+.pattern (the regex they replace, so rule-set fingerprints do not move), search(),
+and finditer() where a rule iterates, returning objects with start() / end() /
+span() / group().
+"""
+import re
+from typing import Iterator, Optional, Sequence, Tuple
+
+
+class Match:
+    __slots__ = ("string", "_start", "_end")
+
+    def __init__(self, string: str, start: int, end: int):
+        self.string = string
+        self._start = start
+        self._end = end
+
+    def start(self) -> int:
+        return self._start
+
+    def end(self) -> int:
+        return self._end
+
+    def span(self) -> Tuple[int, int]:
+        return self._start, self._end
+
+    def group(self, index: int = 0) -> str:
+        if index:
+            raise IndexError("only group 0 is available")
+        return self.string[self._start:self._end]
+
+
+class InOrder:
+    """Alternatives of terms that must appear in order on one line (gaps never cross "\\n").
+
+    min_gap is the shortest gap between consecutive terms: 1 for ".+", 0 for "[^\\n]*".
+    The match starts at the first term's earliest usable occurrence and, like the
+    greedy regex, ends at the last occurrence of the final term on that line.
+    """
+
+    def __init__(self, pattern: str, alternatives: Sequence[Sequence[str]], min_gap: int, flags: int = 0):
+        self.pattern = pattern
+        self.flags = flags
+        self.min_gap = min_gap
+        self._alternatives = [[re.compile(t, flags) for t in terms] for terms in alternatives]
+
+    def search(self, text: str) -> Optional[Match]:
+        best = None
+        for terms in self._alternatives:
+            span = self._first(text, terms)
+            if span is not None and (best is None or span[0] < best[0]):
+                best = span
+        return Match(text, *best) if best is not None else None
+
+    def _first(self, text: str, terms) -> Optional[Tuple[int, int]]:
+        head, rest = terms[0], terms[1:]
+        pos = 0
+        while pos <= len(text):
+            m = head.search(text, pos)
+            if m is None:
+                return None
+            line_end = text.find("\n", m.end())
+            if line_end == -1:
+                line_end = len(text)
+            # the earliest occurrence on a line leaves the most room for the rest, so one
+            # attempt per line decides it
+            end = self._complete(text, rest, m.end(), line_end)
+            if end is not None:
+                return m.start(), end
+            pos = line_end + 1
+        return None
+
+    def _complete(self, text: str, rest, pos: int, line_end: int) -> Optional[int]:
+        last = None
+        for i, term in enumerate(rest):
+            m = term.search(text, pos + self.min_gap, line_end)
+            if m is None:
+                return None
+            if i == len(rest) - 1:
+                last = m
+                # greedy gap: the match runs to the last occurrence on the line
+                for later in term.finditer(text, m.end(), line_end):
+                    last = later
+            pos = m.end()
+        return last.end() if last is not None else pos
+
+
+class UntilClose:
+    """head, then needle anywhere before the next close character.
+
+    With require_close (the lazy "[^)]*?needle[^)]*?\\)" form) the match runs through
+    that close character; otherwise (greedy "[^)]*needle") it ends at the last needle
+    before it, and the region may run to the end of the text.
+    """
+
+    def __init__(self, pattern: str, head: str, needle: str, close: str = ")",
+                 require_close: bool = False, flags: int = 0):
+        self.pattern = pattern
+        self.flags = flags
+        self._head = re.compile(head, flags)
+        self._needle = re.compile(needle, flags)
+        self._close = close
+        self._require_close = require_close
+
+    def search(self, text: str) -> Optional[Match]:
+        return next(self.finditer(text), None)
+
+    def finditer(self, text: str) -> Iterator[Match]:
+        pos = 0
+        failed_until = -1  # a region ending here was searched and held no needle
+        while True:
+            head = self._head.search(text, pos)
+            if head is None:
+                return
+            close = text.find(self._close, head.end())
+            if close == -1:
+                if self._require_close:
+                    return
+                close = len(text)
+            if close != failed_until:
+                needle = self._needle.search(text, head.end(), close)
+                if needle is not None:
+                    if self._require_close:
+                        yield Match(text, head.start(), close + 1)
+                        pos = close + 1
+                    else:
+                        last = needle
+                        for later in self._needle.finditer(text, needle.end(), close):
+                            last = later
+                        yield Match(text, head.start(), last.end())
+                        pos = last.end()
+                    continue
+                # any later head before the same close sees a suffix of this region
+                failed_until = close
+            pos = head.start() + 1
+
+
+class Delimited:
+    """head, then everything up to the first open character and on to the first close after it."""
+
+    def __init__(self, pattern: str, head: str, open_char: str, close_char: str, flags: int = 0):
+        self.pattern = pattern
+        self.flags = flags
+        self._head = re.compile(head, flags)
+        self._open = open_char
+        self._close = close_char
+
+    def search(self, text: str) -> Optional[Match]:
+        return next(self.finditer(text), None)
+
+    def finditer(self, text: str) -> Iterator[Match]:
+        pos = 0
+        while True:
+            head = self._head.search(text, pos)
+            if head is None:
+                return
+            opened = text.find(self._open, head.end())
+            if opened == -1:
+                return  # no later head can find one either
+            closed = text.find(self._close, opened + 1)
+            if closed == -1:
+                return
+            yield Match(text, head.start(), closed + 1)
+            pos = closed + 1
@@ -0,0 +1,221 @@
+# markup.py
+from html.entities import html5 as _HTML5_ENTITIES
+import re
+from typing import List, Optional
+
+# Tag tables from BeautifulSoup's HTMLTreeBuilder; strip_markup() reproduces
+# BeautifulSoup(text, "html.parser").get_text() without building a tree.
+VOID_ELEMENTS = frozenset([
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "keygen", "link",
+    "menuitem", "meta", "param", "source", "track", "wbr",
+    "basefont", "bgsound", "command", "frame", "image", "isindex", "nextid", "spacer",
+])
+STRING_CONTAINERS = frozenset(["rt", "rp", "style", "script", "template"])  # text not in get_text()
+PRESERVE_WHITESPACE = frozenset(["pre", "textarea"])
+# keywords _markupbase accepts after "<![" (every one of them closes with a '>')
+MARKED_SECTIONS = frozenset(["temp", "cdata", "ignore", "include", "rcdata", "if", "else", "endif"])
+
+ASCII_SPACES = "\x20\x0a\x09\x0c\x0d"
+_DECIMAL_REF = re.compile(r"^([0-9]+)(.*)")
+_HEX_REF = re.compile(r"^([0-9a-f]+)(.*)")
+
+
+def _collapse_whitespace(s: str) -> str:
+    # bs4 turns a string made only of ASCII whitespace into one space or newline
+    if s.strip(ASCII_SPACES):
+        return s
+    return "\n" if "\n" in s else " "
+
+
+def _numeric_reference(name: str) -> str:
+    base, reg = 10, _DECIMAL_REF
+    if name[:1] in ("x", "X"):
+        name, base, reg = name[1:], 16, _HEX_REF
+    extra = ""
+    try:
+        n = int(name, base)
+    except ValueError:
+        m = reg.search(name)
+        if m is None:
+            return name
+        n, extra = int(m.group(1), base), m.group(2)
+    if n == 0 or n > 0x10FFFF or 0xD800 <= n <= 0xDFFF:
+        ch = "\ufffd"
+    elif 0x80 <= n <= 0x9F:
+        try:  # references written with their windows-1252 byte value
+            ch = bytes([n]).decode("cp1252")
+        except UnicodeDecodeError:
+            ch = chr(n)
+    else:
+        ch = chr(n)
+    return ch + extra
+
+
+class _TextExtractorBase:
+    """Collects the text get_text() would return while html.parser streams the tags.
+
+    Mixed into HTMLParser by _extractor_class() on first use: html.parser and its
+    regexes stay off the import path of text that never holds markup.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self._scanned = None
+        self._gt_end = self._nul_end = 0
+        self.out: List[str] = []
+        self._data: List[str] = []
+        self._stack: List[str] = []
+        self._open = {}
+        self._containers = 0
+        self._preserve = 0
+        self._closed_void: List[str] = []
+
+    # --- strings ---
+    def _end_data(self, keep: bool = True) -> None:
+        if self._data:
+            s = "".join(self._data)
+            self._data = []
+            if keep and not self._containers:
+                self.out.append(s if self._preserve else _collapse_whitespace(s))
+
+    def handle_data(self, data):
+        self._data.append(data)
+
+    def handle_entityref(self, name):
+        # html.parser hands over the name without its ';'
+        ch = _HTML5_ENTITIES.get(name + ";") or _HTML5_ENTITIES.get(name)
+        self._data.append(ch if ch is not None else "&" + name)
+
+    def handle_charref(self, name):
+        self._data.append(_numeric_reference(name))
+
+    def _skip(self, data):
+        # comments, doctypes, declarations and PIs are not part of the text
+        self._end_data()
+        self._data.append(data)
+        self._end_data(keep=False)
+
+    handle_comment = handle_decl = handle_pi = _skip
+
+    def unknown_decl(self, data):
+        self._end_data()
+        if data.upper().startswith("CDATA["):  # CDATA counts as text, even inside <script>
+            data = data[len("CDATA["):]
+            self.out.append(data if self._preserve else _collapse_whitespace(data))
+        # any other declaration is dropped
+
+    # --- tags ---
+    # html.parser looks for the closing '>' of every construct from scratch, and at the
+    # end of the input it retries from each '<' in turn: quadratic on "<a <a <a ..." or
+    # "</a </a ...". Past the last '>' every one of them is incomplete (-1) anyway.
+    def _past_last_gt(self, i: int, nul_too: bool = False) -> bool:
+        rawdata = self.rawdata
+        if rawdata is not self._scanned:
+            self._scanned = rawdata
+            self._gt_end = rawdata.rfind(">") + 1
+            self._nul_end = rawdata.rfind("\x00") + 1
+        return i >= self._gt_end and (not nul_too or i >= self._nul_end)
+
+    def check_for_whole_start_tag(self, i):
+        # the tolerant start-tag pattern only stops short of the end at '>' or at a NUL
+        # after the tag name; with neither ahead it runs to the end, which means -1
+        if self._past_last_gt(i, nul_too=True):
+            return -1
+        return super().check_for_whole_start_tag(i)
+
+    def parse_endtag(self, i):
+        if self._past_last_gt(i):
+            return -1
+        return super().parse_endtag(i)
+
+    def parse_comment(self, i, report=1):
+        if self._past_last_gt(i):
+            return -1
+        return super().parse_comment(i, report)
+
+    def parse_pi(self, i):
+        if self._past_last_gt(i):
+            return -1
+        return super().parse_pi(i)
+
+    def parse_marked_section(self, i, report=1):
+        # an unknown keyword still goes to html.parser, which raises on it
+        if self._past_last_gt(i):
+            name, j = self._scan_name(i + 3, i)
+            if j < 0 or name in MARKED_SECTIONS:
+                return -1
+        return super().parse_marked_section(i, report)
+
+    def _push(self, tag):
+        self._stack.append(tag)
+        self._open[tag] = self._open.get(tag, 0) + 1
+        if tag in STRING_CONTAINERS:
+            self._containers += 1
+        if tag in PRESERVE_WHITESPACE:
+            self._preserve += 1
+
+    def _pop(self):
+        tag = self._stack.pop()
+        self._open[tag] -= 1
+        if tag in STRING_CONTAINERS:
+            self._containers -= 1
+        if tag in PRESERVE_WHITESPACE:
+            self._preserve -= 1
+
+    def _pop_to(self, tag):
+        if not self._open.get(tag):
+            return
+        while self._stack:
+            if self._stack[-1] == tag:
+                self._pop()
+                return
+            self._pop()
+
+    def handle_starttag(self, tag, attrs, void_closes=True):
+        self._end_data()
+        self._push(tag)
+        if void_closes and tag in VOID_ELEMENTS:
+            self._end_data()
+            self._pop_to(tag)
+            self._closed_void.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs, void_closes=False)
+        self._end_data()
+        self._pop_to(tag)
+
+    def handle_endtag(self, tag):
+        if tag in self._closed_void:  # the </br> of an already closed <br>
+            self._closed_void.remove(tag)
+            return
+        self._end_data()
+        self._pop_to(tag)
+
+    def text(self) -> str:
+        self._end_data()
+        return "".join(self.out)
+
+
+_TextExtractor: Optional[type] = None
+
+
+def _extractor_class() -> type:
+    global _TextExtractor
+    if _TextExtractor is None:
+        from html.parser import HTMLParser
+
+        _TextExtractor = type("_TextExtractor", (_TextExtractorBase, HTMLParser), {})
+    return _TextExtractor
+
+
+def strip_markup(text: str) -> str:
+    """Same result as BeautifulSoup(text, "html.parser").get_text(), without the tree.
+
+    Text with no '<' or '&' has no tags or entities and skips the parser entirely.
+    """
+    if "<" not in text and "&" not in text:
+        return _collapse_whitespace(text) if text else text
+    parser = _extractor_class()()
+    parser.feed(text)
+    parser.close()
+    return parser.text()
@@ -0,0 +1,196 @@
+# metrics.py
+"""Opt-in per-stage timing and counters for normalize_and_detect, in Prometheus text format.
+
+    import metrics
+    registry = metrics.enable()          # every normalize_and_detect call is now recorded
+    ...
+    print(registry.to_prometheus())      # serve this from your /metrics handler
+    metrics.disable()
+
+    python metrics.py --limit 2000       # run the bundled parquet and print the export
+
+While disabled (the default) the pipeline only checks one module global per call and
+a None timer at each stage boundary. Stages are the ones in STAGES; the normalize_text
+sub-stages are unicode, markup, invisible_emoji (control chars and emoji), decode,
+deobfuscate and split_merge. Counters cover decisions and rule hits (the
+DetectionResult.rule_hits ids, split into rule family and name). Any object with
+new_timer() and record(timer, seconds, result) can stand in for Metrics as the sink.
+"""
+import argparse
+import sys
+import threading
+from bisect import bisect_left
+from collections import Counter
+from time import perf_counter
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import normalizer
+
+STAGES = ("intent", "aggressive_clean", "arabic", "unicode", "markup", "invisible_emoji", "decode",
+          "deobfuscate", "split_merge", "keywords")
+# seconds; 10 µs .. 250 ms, the range a single text's stage or request falls in
+BUCKETS = (1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25)
+PREFIX = "arabguard"
+
+
+class StageTimer:
+    """Marks stage boundaries: timer(stage) books the time since the previous mark."""
+
+    __slots__ = ("last", "stages")
+
+    def __init__(self):
+        self.stages: List[Tuple[str, float]] = []
+        self.last = perf_counter()
+
+    def __call__(self, stage: str) -> None:
+        now = perf_counter()
+        self.stages.append((stage, now - self.last))
+        self.last = now
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Sequence[float] = BUCKETS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        out, running = [], 0
+        for bound, n in zip(self.bounds + (float("inf"),), self.counts):
+            running += n
+            out.append(("+Inf" if bound == float("inf") else repr(bound), running))
+        return out
+
+
+class Metrics:
+    """Thread-safe aggregate of stage histograms, decision and rule-hit counters."""
+
+    def __init__(self, buckets: Sequence[float] = BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.stages: Dict[str, Histogram] = {}
+            self.requests = Histogram(self.buckets)
+            self.decisions: Counter = Counter()
+            self.rules: Counter = Counter()
+            self.cached = 0
+
+    def new_timer(self) -> StageTimer:
+        return StageTimer()
+
+    def record(self, timer: Optional[StageTimer], seconds: float, result: "normalizer.DetectionResult") -> None:
+        """Called by normalizer.detect once per text; timer is None for a cache hit."""
+        hits = [tuple(rule_id.split(":", 1)) for rule_id in result.rule_hits]
+        with self._lock:
+            self.requests.observe(seconds)
+            self.decisions[result.decision] += 1
+            self.rules.update(hits)
+            if timer is None:
+                self.cached += 1
+                return
+            for stage, elapsed in timer.stages:
+                hist = self.stages.get(stage)
+                if hist is None:
+                    hist = self.stages[stage] = Histogram(self.buckets)
+                hist.observe(elapsed)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Plain-dict copy: per-stage count/sum/mean, decisions and rule hits."""
+        with self._lock:
+            return {
+                "requests": self.requests.count,
+                "cached": self.cached,
+                "seconds": self.requests.sum,
+                "stages": {s: {"count": h.count, "seconds": h.sum, "mean_ms": h.sum / h.count * 1e3}
+                           for s, h in self.stages.items() if h.count},
+                "decisions": dict(self.decisions),
+                "rules": {f"{rule}:{name}": n for (rule, name), n in self.rules.items()},
+            }
+
+    def to_prometheus(self, prefix: str = PREFIX) -> str:
+        with self._lock:
+            lines: List[str] = []
+            _histogram(lines, f"{prefix}_request_seconds", "End-to-end normalize_and_detect time.",
+                       [((), self.requests)])
+            order = {s: i for i, s in enumerate(STAGES)}
+            stages = sorted(self.stages.items(), key=lambda kv: (order.get(kv[0], len(order)), kv[0]))
+            _histogram(lines, f"{prefix}_stage_seconds", "Time spent in each pipeline stage.",
+                       [((("stage", s),), h) for s, h in stages])
+            lines.append(f"# HELP {prefix}_cache_hits_total Results served from a ResultCache (no stage timings).")
+            lines.append(f"# TYPE {prefix}_cache_hits_total counter")
+            lines.append(f"{prefix}_cache_hits_total {self.cached}")
+            lines.append(f"# HELP {prefix}_decisions_total Texts per final decision.")
+            lines.append(f"# TYPE {prefix}_decisions_total counter")
+            for decision in sorted(self.decisions):
+                lines.append(f"{prefix}_decisions_total{_labels((('decision', decision),))} {self.decisions[decision]}")
+            lines.append(f"# HELP {prefix}_rule_hits_total Rule matches by rule family and keyword / token.")
+            lines.append(f"# TYPE {prefix}_rule_hits_total counter")
+            for (rule, name), n in sorted(self.rules.items()):
+                lines.append(f"{prefix}_rule_hits_total{_labels((('rule', rule), ('name', name)))} {n}")
+            return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(pairs) -> str:
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}" if pairs else ""
+
+
+def _histogram(lines: List[str], name: str, help_text: str, series) -> None:
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} histogram")
+    for labels, hist in series:
+        for le, n in hist.cumulative():
+            lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {n}")
+        lines.append(f"{name}_sum{_labels(labels)} {hist.sum!r}")
+        lines.append(f"{name}_count{_labels(labels)} {hist.count}")
+
+
+def enable(registry: Optional[Metrics] = None) -> Metrics:
+    """Start recording every normalize_and_detect call in this process into registry."""
+    registry = registry if registry is not None else Metrics()
+    normalizer.set_metrics(registry)
+    return registry
+
+
+def disable() -> None:
+    normalizer.set_metrics(None)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--dataset", default="data/translated_data_clean_10.parquet")
+    parser.add_argument("--limit", type=int, default=0)
+    parser.add_argument("--fast", action="store_true", help="use the early-exit pipeline")
+    args = parser.parse_args(argv)
+
+    import pandas as pd
+
+    texts = pd.read_parquet(args.dataset, columns=["text"])["text"]
+    if args.limit:
+        texts = texts.head(args.limit)
+    normalizer.english_words.load()
+    normalizer.normalize_and_detect("warm up")  # first call imports emoji
+    registry = enable()
+    for text in texts:
+        normalizer.detect(text if isinstance(text, str) else "", fast=args.fast)
+    disable()
+    sys.stdout.write(registry.to_prometheus())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
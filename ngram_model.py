@@ -0,0 +1,272 @@
+# ngram_model.py
+"""Hashed character / word n-gram logistic regression: a cheap learned scoring tier.
+
+    python ngram_model.py train data/translated_data_clean_10.parquet data/ngram_model.npz
+    python ngram_model.py bench data/ngram_model.npz
+
+Features are the n-grams pattern.ipynb counted with CountVectorizer (character 2-4
+grams and word 1-2 grams) of normalize_and_detect's output. They are hashed into
+2**bits signed buckets, so there is no vocabulary to keep, and a text's vector is
+scaled by 1/sqrt(its n-gram count). A whole batch is featurised at once with NumPy:
+code points of all texts are rolled into polynomial hashes in a few array passes,
+and the sparse matrix-vector product is one np.bincount over (row, bucket) pairs.
+The model is one .npz file: the weight vector, the bias, the feature settings and
+the RuleSet.version whose normalized text it was trained on. The features only mean
+something for that normalizer, so load() refuses a model trained under any other
+version: retrain it (`train`) whenever the pipeline or the rule pack changes.
+"""
+import argparse
+import json
+import sys
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+DATASET = "data/translated_data_clean_10.parquet"
+
+_P = np.uint64(0x100000001B3)  # FNV-1 prime, the rolling-hash multiplier
+_M1 = np.uint64(0xBF58476D1CE4E5B9)
+_M2 = np.uint64(0x94D049BB133111EB)
+_CHAR_SEED = 0x9E3779B97F4A7C15
+_WORD_SEED = 0xD6E8FEB86659FD93
+_SPACES = np.array([0x20, 0x09, 0x0A, 0x0D, 0xA0, 0x3000], dtype=np.uint64)
+
+
+def _mix(h: np.ndarray) -> np.ndarray:
+    # splitmix64 finaliser: spreads every input bit over the whole word
+    h = h ^ (h >> np.uint64(30))
+    h = h * _M1
+    h = h ^ (h >> np.uint64(27))
+    h = h * _M2
+    return h ^ (h >> np.uint64(31))
+
+
+def _rolling(seq: np.ndarray, owner: np.ndarray, n: int, seed: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Hashes of all length-n windows of seq that stay inside one text."""
+    m = len(seq) - n + 1
+    if m <= 0:
+        return np.empty(0, np.uint64), np.empty(0, np.int64)
+    h = np.full(m, np.uint64((seed + n) & 0xFFFFFFFFFFFFFFFF))
+    for k in range(n):
+        h = h * _P + seq[k:k + m]
+    inside = owner[:m] == owner[n - 1:n - 1 + m]
+    return h[inside], owner[:m][inside]
+
+
+def featurize(texts: Sequence[str], bits: int = 18, char_ngrams: Tuple[int, int] = (2, 4),
+              word_ngrams: Tuple[int, int] = (1, 2)) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Sparse rows as parallel arrays (row, bucket, value); duplicates add up."""
+    padded = [" " + (t.lower() if isinstance(t, str) else "") + " " for t in texts]
+    lengths = np.fromiter((len(p) for p in padded), dtype=np.int64, count=len(padded))
+    cp = np.frombuffer("".join(padded).encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    owner = np.repeat(np.arange(len(padded), dtype=np.int64), lengths)
+
+    hashes, rows = [], []
+    for n in range(char_ngrams[0], char_ngrams[1] + 1):
+        h, r = _rolling(cp, owner, n, _CHAR_SEED)
+        hashes.append(h)
+        rows.append(r)
+
+    # words: runs of non-space; a word's hash sums position-salted hashes of its characters
+    is_space = np.isin(cp, _SPACES)
+    is_start = ~is_space
+    is_start[1:] &= is_space[:-1]
+    starts = np.flatnonzero(is_start)
+    if len(starts):
+        idx = np.arange(len(cp), dtype=np.int64)
+        pos = idx - np.maximum.accumulate(np.where(is_start, idx, 0))
+        v = _mix(cp * _P + pos.astype(np.uint64))
+        v[is_space] = 0
+        words = _mix(np.add.reduceat(v, starts))
+        word_owner = owner[starts]
+        for n in range(word_ngrams[0], word_ngrams[1] + 1):
+            h, r = _rolling(words, word_owner, n, _WORD_SEED)
+            hashes.append(h)
+            rows.append(r)
+
+    h = _mix(np.concatenate(hashes)) if hashes else np.empty(0, np.uint64)
+    row = np.concatenate(rows) if rows else np.empty(0, np.int64)
+    bucket = (h >> np.uint64(64 - bits)).astype(np.int64)
+    value = np.where((h >> np.uint64(32)) & np.uint64(1), 1.0, -1.0).astype(np.float32)
+    counts = np.bincount(row, minlength=len(padded)).astype(np.float32)
+    value /= np.sqrt(np.maximum(counts, 1.0))[row]
+    return row, bucket, value
+
+
+def _sigmoid(z: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-np.clip(z, -30.0, 30.0)))
+
+
+class NgramModel:
+    """Logistic regression over hashed n-grams; scores normalized text.
+
+    input_kind tells CascadeDetector to pass normalize_and_detect's output.
+    """
+
+    input_kind = "normalized"
+
+    def __init__(self, weights: np.ndarray, bias: float = 0.0, char_ngrams: Tuple[int, int] = (2, 4),
+                 word_ngrams: Tuple[int, int] = (1, 2), meta: Optional[Dict] = None):
+        bits = int(np.log2(len(weights)))
+        if 1 << bits != len(weights):
+            raise ValueError("weights length must be a power of two")
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.bias = float(bias)
+        self.bits = bits
+        self.char_ngrams = tuple(char_ngrams)
+        self.word_ngrams = tuple(word_ngrams)
+        self.meta = dict(meta or {})
+
+    def decision_function(self, texts: Sequence[str]) -> np.ndarray:
+        if not len(texts):
+            return np.zeros(0, dtype=np.float32)
+        row, bucket, value = featurize(texts, self.bits, self.char_ngrams, self.word_ngrams)
+        return np.bincount(row, weights=value * self.weights[bucket], minlength=len(texts)) + self.bias
+
+    def unsafe_probability(self, texts: Sequence[str]) -> np.ndarray:
+        return _sigmoid(self.decision_function(texts))
+
+    def save(self, path: str) -> None:
+        config = {"bias": self.bias, "char_ngrams": self.char_ngrams,
+                  "word_ngrams": self.word_ngrams, "meta": self.meta}
+        np.savez_compressed(path, weights=self.weights.astype(np.float16), config=np.array(json.dumps(config)))
+
+    @classmethod
+    def load(cls, path: str, check_ruleset: bool = True) -> "NgramModel":
+        """Read a saved model; ValueError if it was trained under another RuleSet.version."""
+        with np.load(path, allow_pickle=False) as f:
+            config = json.loads(str(f["config"]))
+            weights = f["weights"].astype(np.float32)
+        model = cls(weights, config["bias"], config["char_ngrams"], config["word_ngrams"], config.get("meta"))
+        if check_ruleset:
+            import normalizer
+
+            trained, current = model.meta.get("ruleset"), normalizer.current_rules().version
+            if trained != current:
+                raise ValueError(f"{path} was trained on normalizer output of ruleset {trained or 'unknown'}, "
+                                 f"this one is {current}; retrain it with `python ngram_model.py train`")
+        return model
+
+
+def train(texts: Sequence[str], labels: Sequence[int], bits: int = 18, epochs: int = 150,
+          lr: float = 0.05, l2: float = 1e-5, char_ngrams: Tuple[int, int] = (2, 4),
+          word_ngrams: Tuple[int, int] = (1, 2), chunk: int = 2000) -> NgramModel:
+    """Full-batch Adam on the L2-regularised logistic loss; label != 0 is unsafe."""
+    rows, buckets, values = [], [], []
+    for start in range(0, len(texts), chunk):
+        r, b, v = featurize(texts[start:start + chunk], bits, char_ngrams, word_ngrams)
+        rows.append((r + start).astype(np.int32))
+        buckets.append(b.astype(np.int32))
+        values.append(v)
+    row, bucket, value = np.concatenate(rows), np.concatenate(buckets), np.concatenate(values)
+    y = (np.asarray(labels) != 0).astype(np.float64)
+    n, dim = len(y), 1 << bits
+
+    w = np.zeros(dim, dtype=np.float64)
+    b = float(np.log((y.mean() + 1e-6) / (1 - y.mean() + 1e-6)))
+    m_w, v_w = np.zeros(dim), np.zeros(dim)
+    m_b = v_b = 0.0
+    beta1, beta2, eps = 0.9, 0.999, 1e-8
+    for t in range(1, epochs + 1):
+        z = np.bincount(row, weights=value * w[bucket], minlength=n) + b
+        r = (_sigmoid(z) - y) / n
+        g_w = np.bincount(bucket, weights=value * r[row], minlength=dim) + l2 * w
+        g_b = r.sum()
+        m_w = beta1 * m_w + (1 - beta1) * g_w
+        v_w = beta2 * v_w + (1 - beta2) * g_w * g_w
+        m_b = beta1 * m_b + (1 - beta1) * g_b
+        v_b = beta2 * v_b + (1 - beta2) * g_b * g_b
+        step = lr * np.sqrt(1 - beta2 ** t) / (1 - beta1 ** t)
+        w -= step * m_w / (np.sqrt(v_w) + eps)
+        b -= step * m_b / (np.sqrt(v_b) + eps)
+    return NgramModel(w, b, char_ngrams, word_ngrams)
+
+
+def _split(n: int, test_size: float = 0.1, seed: int = 42) -> Tuple[np.ndarray, np.ndarray]:
+    order = np.random.RandomState(seed).permutation(n)
+    cut = int(round(n * test_size))
+    return order[cut:], order[:cut]
+
+
+def _metrics(pred: np.ndarray, y: np.ndarray) -> Dict[str, float]:
+    tp = float(np.sum(pred & y))
+    precision = tp / max(float(pred.sum()), 1.0)
+    recall = tp / max(float(y.sum()), 1.0)
+    return {"accuracy": round(float(np.mean(pred == y)), 4), "precision": round(precision, 4),
+            "recall": round(recall, 4), "f1": round(2 * precision * recall / max(precision + recall, 1e-9), 4)}
+
+
+def _normalized_texts(path: str, limit: int = 0) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    # normalized in worker processes, which load the same rules as this one
+    import pandas as pd
+
+    from batch import normalize_and_detect_batch
+
+    df = pd.read_parquet(path)
+    if limit:
+        df = df.head(limit)
+    results = normalize_and_detect_batch(df["text"].tolist())
+    normalized = [r[0] for r in results]
+    rule_blocked = np.array([r[2] != "SAFE" for r in results])
+    return normalized, df["label"].to_numpy() != 0, rule_blocked
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+    tr = sub.add_parser("train", help="train on a parquet with text/label columns")
+    tr.add_argument("dataset", nargs="?", default=DATASET)
+    tr.add_argument("output", nargs="?", default="data/ngram_model.npz")
+    tr.add_argument("--bits", type=int, default=18)
+    tr.add_argument("--epochs", type=int, default=150)
+    tr.add_argument("--lr", type=float, default=0.05)
+    tr.add_argument("--l2", type=float, default=1e-5)
+    tr.add_argument("--test-size", type=float, default=0.1, help="held out for the report (0: train on all)")
+    be = sub.add_parser("bench", help="texts/s of featurising + scoring")
+    be.add_argument("model")
+    be.add_argument("--dataset", default=DATASET)
+    be.add_argument("--batch-size", type=int, default=256)
+    args = parser.parse_args(argv)
+
+    if args.command == "train":
+        t0 = time.perf_counter()
+        texts, y, rule_blocked = _normalized_texts(args.dataset)
+        print(f"normalized {len(texts)} texts in {time.perf_counter() - t0:.1f} s")
+        train_idx, test_idx = _split(len(texts), args.test_size) if args.test_size else (np.arange(len(texts)), [])
+        t0 = time.perf_counter()
+        model = train([texts[i] for i in train_idx], y[train_idx], args.bits, args.epochs, args.lr, args.l2)
+        print(f"trained on {len(train_idx)} texts in {time.perf_counter() - t0:.1f} s")
+        if len(test_idx):
+            probs = model.unsafe_probability([texts[i] for i in test_idx])
+            model.meta["holdout"] = _metrics(probs >= 0.5, y[test_idx])
+            rules = _metrics(rule_blocked[test_idx], y[test_idx])
+            print(f"held-out {len(test_idx)}: model {model.meta['holdout']}\n"
+                  f"{'':>14}rules {rules}")
+        import normalizer
+
+        model.meta.update(dataset=args.dataset, trained_on=int(len(train_idx)), epochs=args.epochs,
+                          ruleset=normalizer.current_rules().version)
+        model.save(args.output)
+        print(f"wrote {args.output}")
+        return 0
+
+    model = NgramModel.load(args.model)
+    texts, _, _ = _normalized_texts(args.dataset)
+    model.unsafe_probability(texts[:args.batch_size])  # warm up
+    t0 = time.perf_counter()
+    for start in range(0, len(texts), args.batch_size):
+        model.unsafe_probability(texts[start:start + args.batch_size])
+    elapsed = time.perf_counter() - t0
+    single = texts[:500]
+    t1 = time.perf_counter()
+    for t in single:
+        model.unsafe_probability([t])
+    one = (time.perf_counter() - t1) / len(single)
+    print(f"{len(texts)} texts in {elapsed:.3f} s: {len(texts) / elapsed:,.0f} texts/s batched "
+          f"(batch {args.batch_size}), {one * 1e3:.3f} ms per single text")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+# result_cache.py
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+
+class ResultCache:
+    """Thread-safe LRU + TTL cache for deterministic detection results.
+
+    Keys are a BLAKE2b digest of the input together with the rule-set version, so a
+    rule change never serves stale results. Memory is bounded by maxsize entries;
+    inputs longer than max_text_len characters are passed through uncached.
+    """
+
+    def __init__(self, maxsize: int = 10_000, ttl: Optional[float] = None, max_text_len: int = 16_384):
+        if maxsize <= 0:
+            raise ValueError("maxsize must be positive")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_text_len = max_text_len
+        self._data: "OrderedDict[bytes, tuple]" = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.bypassed = 0
+
+    @staticmethod
+    def make_key(text: str, version: str) -> bytes:
+        from hashlib import blake2b  # OpenSSL-backed hashlib costs ~4 ms to import; only caches need it
+
+        h = blake2b(digest_size=16)
+        h.update(version.encode("utf-8"))
+        h.update(b"\0")
+        h.update(text.encode("utf-8", "surrogatepass"))
+        return h.digest()
+
+    def get_or_compute(self, text: str, version: str, compute: Callable[[str], Any]) -> Any:
+        """Cached compute(text) for this rule-set version."""
+        if len(text) > self.max_text_len:
+            with self._lock:
+                self.bypassed += 1
+            return compute(text)
+        key = self.make_key(text, version)
+        value = self.get(key)
+        if value is None:
+            value = compute(text)
+            self.put(key, value)
+        return value
+
+    def get(self, key: bytes) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: bytes, value: Any) -> None:
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "bypassed": self.bypassed,
+            }
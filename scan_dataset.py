@@ -0,0 +1,175 @@
+# scan_dataset.py
+"""Stream a labeled dataset through the detection pipeline with bounded memory.
+
+    python scan_dataset.py data/translated_data_clean_10.parquet scored/ --workers 4
+
+The input (Parquet, CSV or JSONL) is read one record batch at a time and every batch
+gets final_normalized/score/decision columns before it is written out. Output is a
+Parquet dataset directory (part-00000.parquet, ...) that pd.read_parquet() reads as
+one table. A part only becomes visible once complete and _checkpoint.json records how
+many input rows are done, so re-running the same command after an interruption
+resumes where it stopped instead of starting over.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from contextlib import nullcontext
+from typing import Iterator, Optional
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from batch import make_pool, normalize_and_detect_batch
+
+CHECKPOINT = "_checkpoint.json"
+
+
+def iter_record_batches(path: str, batch_size: int) -> Iterator[pa.RecordBatch]:
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".parquet", ".pq"):
+        yield from pq.ParquetFile(path).iter_batches(batch_size=batch_size)
+    elif ext == ".csv":
+        import pyarrow.csv as pcsv
+
+        reader = pcsv.open_csv(path, read_options=pcsv.ReadOptions(block_size=1 << 20))
+        yield from _rebatch(reader, batch_size)
+    elif ext in (".jsonl", ".json", ".ndjson"):
+        import pyarrow.json as pjson
+
+        if hasattr(pjson, "open_json"):
+            yield from _rebatch(pjson.open_json(path), batch_size)
+        else:  # older pyarrow: let pandas chunk the lines
+            import pandas as pd
+
+            for chunk in pd.read_json(path, lines=True, chunksize=batch_size):
+                yield pa.RecordBatch.from_pandas(chunk, preserve_index=False)
+    else:
+        raise ValueError(f"unsupported input format: {path}")
+
+
+def _rebatch(reader, batch_size: int) -> Iterator[pa.RecordBatch]:
+    # streaming readers hand out blocks of arbitrary size; cut them to batch_size
+    for block in reader:
+        for start in range(0, block.num_rows, batch_size):
+            yield block.slice(start, batch_size)
+
+
+def _skip_rows(batches: Iterator[pa.RecordBatch], rows: int) -> Iterator[pa.RecordBatch]:
+    for rb in batches:
+        if rows >= rb.num_rows:
+            rows -= rb.num_rows
+            continue
+        yield rb.slice(rows) if rows else rb
+        rows = 0
+
+
+def _load_checkpoint(out_dir: str, input_path: str) -> dict:
+    path = os.path.join(out_dir, CHECKPOINT)
+    if not os.path.exists(path):
+        return {"input": os.path.abspath(input_path), "rows_done": 0, "parts": 0}
+    with open(path, encoding="utf-8") as f:
+        state = json.load(f)
+    if state["input"] != os.path.abspath(input_path):
+        raise SystemExit(f"{out_dir} holds results for {state['input']}; use another output directory")
+    return state
+
+
+def _save_checkpoint(out_dir: str, state: dict) -> None:
+    tmp = os.path.join(out_dir, CHECKPOINT + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp, os.path.join(out_dir, CHECKPOINT))
+
+
+def score_record_batch(rb: pa.RecordBatch, text_column: str, pool, chunksize: int) -> pa.RecordBatch:
+    results = normalize_and_detect_batch(
+        rb.column(text_column).to_pylist(), workers=1, pool=pool, chunksize=chunksize
+    )
+    normalized, scores, decisions = zip(*results) if results else ((), (), ())
+    columns = [c for c in rb.schema.names if c not in ("final_normalized", "score", "decision")]
+    return pa.RecordBatch.from_arrays(
+        [rb.column(c) for c in columns]
+        + [pa.array(normalized, pa.string()), pa.array(scores, pa.int32()), pa.array(decisions, pa.string())],
+        names=columns + ["final_normalized", "score", "decision"],
+    )
+
+
+def scan(
+    input_path: str,
+    out_dir: str,
+    text_column: str = "text",
+    batch_size: int = 10_000,
+    rows_per_part: int = 200_000,
+    workers: Optional[int] = None,
+    chunksize: int = 256,
+) -> dict:
+    os.makedirs(out_dir, exist_ok=True)
+    state = _load_checkpoint(out_dir, input_path)
+    if state.get("complete"):
+        print(f"{out_dir}: already complete ({state['rows_done']} rows)")
+        return state
+    if state["rows_done"]:
+        print(f"resuming after {state['rows_done']} rows ({state['parts']} parts)")
+
+    batches = _skip_rows(iter_record_batches(input_path, batch_size), state["rows_done"])
+    writer = None
+    part_rows = 0
+    part_tmp = part_final = ""
+    started = time.time()
+    scanned = 0
+
+    def close_part():
+        nonlocal writer, part_rows
+        writer.close()
+        os.replace(part_tmp, part_final)
+        state["rows_done"] += part_rows
+        state["parts"] += 1
+        _save_checkpoint(out_dir, state)
+        writer, part_rows = None, 0
+
+    with (nullcontext() if workers == 1 else make_pool(workers)) as pool:
+        for rb in batches:
+            scored = score_record_batch(rb, text_column, pool, chunksize)
+            if writer is None:
+                part_final = os.path.join(out_dir, f"part-{state['parts']:05d}.parquet")
+                part_tmp = part_final + ".tmp"
+                writer = pq.ParquetWriter(part_tmp, scored.schema)
+            writer.write_batch(scored)
+            part_rows += scored.num_rows
+            scanned += scored.num_rows
+            if part_rows >= rows_per_part:
+                close_part()
+            elapsed = time.time() - started
+            print(f"\r{state['rows_done'] + part_rows} rows  ({scanned / max(elapsed, 1e-9):.0f} rows/s)",
+                  end="", file=sys.stderr, flush=True)
+        if writer is not None:
+            close_part()
+
+    print(file=sys.stderr)
+    state["complete"] = True
+    _save_checkpoint(out_dir, state)
+    return state
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("input", help="Parquet, CSV or JSONL file")
+    parser.add_argument("output", help="output Parquet dataset directory")
+    parser.add_argument("--text-column", default="text")
+    parser.add_argument("--batch-size", type=int, default=10_000, help="rows read and scored at a time")
+    parser.add_argument("--rows-per-part", type=int, default=200_000, help="rows per output part file")
+    parser.add_argument("--workers", type=int, default=None, help="process pool size (default: all cores)")
+    parser.add_argument("--chunksize", type=int, default=256, help="rows sent to a worker at a time")
+    args = parser.parse_args(argv)
+    try:
+        state = scan(args.input, args.output, args.text_column, args.batch_size,
+                     args.rows_per_part, args.workers, args.chunksize)
+    except KeyboardInterrupt:
+        raise SystemExit("\ninterrupted; run the same command again to resume")
+    print(f"{state['rows_done']} rows in {state['parts']} parts -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+# server.py
+"""Local detection service over HTTP (TCP or Unix socket) with micro-batching.
+
+    python server.py --port 8787
+    python server.py --unix /run/arabguard.sock --workers 4
+
+    POST /scan        {"text": "..."}           -> {"normalized", "score", "decision", "blocked", "windows", "ruleset"}
+    POST /scan_batch  {"texts": ["...", ...]}   -> {"results": [...]}
+    GET  /health                                -> queue / batch counters, workers' ruleset
+
+Concurrent requests are queued and grouped into micro-batches of up to --max-batch
+texts, waiting at most --max-wait-ms for a batch to fill. Batches run in a process
+pool, so the event loop never blocks on detection. The queue is bounded: once
+--max-queue texts are waiting, new requests get 503 + Retry-After instead of piling up;
+a /scan_batch larger than the whole queue can never fit and gets 413.
+Texts longer than normalizer.WINDOW_CHARS are scored in windows (detect_long), so
+one pasted document cannot hold a worker for long. Their score is the best window's,
+not the whole text's; "windows" says how many there were (0 for a text scored whole).
+
+The rules live in the pool workers, loaded when each starts: /health reports the
+ruleset they score with (as in the "ruleset" of every result), not this process's.
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+from batch import detect_chunk, make_pool, ruleset_version
+
+MAX_HEADER_LINES = 100
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            411: "Length Required", 413: "Payload Too Large", 431: "Request Header Fields Too Large",
+            500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class Overloaded(Exception):
+    """The batch queue has no room for the request."""
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class MicroBatcher:
+    """Groups queued texts into batches and runs them in an executor.
+
+    At most max_inflight batches are in the executor at once; while they are busy,
+    new texts wait in the bounded queue, which is what makes the next batch bigger
+    and what eventually pushes back on clients.
+    """
+
+    def __init__(self, executor, max_batch: int = 64, max_wait: float = 0.002,
+                 max_queue: int = 4096, max_inflight: int = 1):
+        self.executor = executor
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self._queue: asyncio.Queue = asyncio.Queue(max_queue)
+        self._inflight = asyncio.Semaphore(max_inflight)
+        self._task: Optional[asyncio.Task] = None
+        self.batches = 0
+        self.texts = 0
+        self.rejected = 0
+        # the version the workers score with: reload_rules() in this process never
+        # reaches them, so it is read from their results (and asked once at start)
+        self.ruleset: Optional[str] = None
+
+    def start(self) -> None:
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def ask_ruleset(self) -> str:
+        self.ruleset = await asyncio.get_running_loop().run_in_executor(self.executor, ruleset_version)
+        return self.ruleset
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    @property
+    def queued(self) -> int:
+        return self._queue.qsize()
+
+    async def submit(self, texts: List[str]) -> List[tuple]:
+        """Queue texts as a unit; results come back in order. Raises Overloaded."""
+        if self._queue.maxsize - self._queue.qsize() < len(texts):
+            self.rejected += 1
+            raise Overloaded()
+        loop = asyncio.get_running_loop()
+        futures = []
+        for text in texts:
+            fut = loop.create_future()
+            self._queue.put_nowait((text, fut))
+            futures.append(fut)
+        return list(await asyncio.gather(*futures))
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._inflight.acquire()
+            try:
+                batch = [await self._queue.get()]
+                self._drain(batch)
+                if len(batch) < self.max_batch and self.max_wait > 0:
+                    await asyncio.sleep(self.max_wait)  # let concurrent requests join
+                    self._drain(batch)
+            except BaseException:
+                self._inflight.release()
+                raise
+            loop.create_task(self._run_batch(batch))
+
+    def _drain(self, batch: list) -> None:
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                return
+
+    async def _run_batch(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(
+                self.executor, detect_chunk, [text for text, _ in batch], False, True, True
+            )
+            self.batches += 1
+            self.texts += len(batch)
+            if results:
+                self.ruleset = results[-1][-1]
+            for (_, fut), result in zip(batch, results):
+                if not fut.done():
+                    fut.set_result(result)
+        except Exception as exc:
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(exc)
+        finally:
+            self._inflight.release()
+
+
+def _result(row: tuple) -> Dict[str, Any]:
+    normalized, score, decision, windows, ruleset = row
+    return {"normalized": normalized, "score": score, "decision": decision,
+            "blocked": decision == "BLOCKED", "windows": windows, "ruleset": ruleset}
+
+
+class DetectionService:
+    """Routes parsed HTTP requests to the batcher."""
+
+    def __init__(self, batcher: MicroBatcher, max_body: int = 1 << 20, max_batch_texts: int = 1024):
+        self.batcher = batcher
+        self.max_body = max_body
+        # submit() takes a request whole: a batch larger than the queue could never fit
+        self.max_batch_texts = min(max_batch_texts, batcher.max_queue)
+
+    async def dispatch(self, method: str, path: str, body: bytes) -> Tuple[int, Dict[str, Any]]:
+        if path == "/health":
+            if method != "GET":
+                raise HTTPError(405, "use GET")
+            b = self.batcher
+            return 200, {"status": "ok", "ruleset": b.ruleset, "queued": b.queued,
+                         "batches": b.batches, "texts": b.texts, "rejected": b.rejected,
+                         "mean_batch": round(b.texts / b.batches, 2) if b.batches else 0.0}
+        if path not in ("/scan", "/scan_batch"):
+            raise HTTPError(404, f"no route for {path}")
+        if method != "POST":
+            raise HTTPError(405, "use POST")
+        try:
+            payload = json.loads(body)
+        except (ValueError, UnicodeDecodeError):
+            raise HTTPError(400, "body must be JSON") from None
+        if path == "/scan":
+            text = payload.get("text") if isinstance(payload, dict) else None
+            if not isinstance(text, str):
+                raise HTTPError(400, 'expected {"text": "<string>"}')
+            (row,) = await self.batcher.submit([text])
+            return 200, _result(row)
+        texts = payload.get("texts") if isinstance(payload, dict) else None
+        if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+            raise HTTPError(400, 'expected {"texts": ["<string>", ...]}')
+        if len(texts) > self.max_batch_texts:
+            raise HTTPError(413, f"at most {self.max_batch_texts} texts per request")
+        rows = await self.batcher.submit(texts) if texts else []
+        return 200, {"results": [_result(r) for r in rows]}
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    request = await _read_request(reader, self.max_body)
+                except HTTPError as e:
+                    await _write_response(writer, e.status, {"error": str(e)}, keep_alive=False)
+                    return
+                if request is None:
+                    return
+                method, path, headers, body = request
+                keep_alive = headers.get("connection", "").lower() != "close"
+                extra = {}
+                try:
+                    status, payload = await self.dispatch(method, path, body)
+                except HTTPError as e:
+                    status, payload = e.status, {"error": str(e)}
+                except Overloaded:
+                    status, payload = 503, {"error": "overloaded, retry later"}
+                    extra["Retry-After"] = "1"
+                except Exception as e:  # keep serving other requests
+                    status, payload = 500, {"error": f"{type(e).__name__}: {e}"}
+                await _write_response(writer, status, payload, keep_alive, extra)
+                if not keep_alive:
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+async def _read_request(reader: asyncio.StreamReader, max_body: int):
+    """(method, path, headers, body) of the next HTTP/1.1 request, None at EOF."""
+    try:
+        line = await reader.readline()
+    except (asyncio.LimitOverrunError, ValueError):
+        raise HTTPError(431, "request line too long") from None
+    if not line:
+        return None
+    parts = line.decode("latin-1").split()
+    if len(parts) != 3 or not parts[2].startswith("HTTP/"):
+        raise HTTPError(400, "malformed request line")
+    method, target, _ = parts
+    headers: Dict[str, str] = {}
+    for _ in range(MAX_HEADER_LINES):
+        try:
+            line = await reader.readline()
+        except (asyncio.LimitOverrunError, ValueError):
+            raise HTTPError(431, "header line too long") from None
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, sep, value = line.decode("latin-1").partition(":")
+        if not sep:
+            raise HTTPError(400, "malformed header")
+        headers[name.strip().lower()] = value.strip()
+    else:
+        raise HTTPError(431, "too many headers")
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        raise HTTPError(411, "send a Content-Length body")
+    try:
+        length = int(headers.get("content-length", "0"))
+    except ValueError:
+        raise HTTPError(400, "bad Content-Length") from None
+    if length < 0:
+        raise HTTPError(400, "bad Content-Length")
+    if length > max_body:
+        raise HTTPError(413, f"body larger than {max_body} bytes")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), target.split("?", 1)[0], headers, body
+
+
+async def _write_response(writer: asyncio.StreamWriter, status: int, payload: Dict[str, Any],
+                          keep_alive: bool = True, extra: Optional[Dict[str, str]] = None) -> None:
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    head = [f"HTTP/1.1 {status} {_REASONS.get(status, '')}",
+            "Content-Type: application/json; charset=utf-8",
+            f"Content-Length: {len(body)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+    head += [f"{k}: {v}" for k, v in (extra or {}).items()]
+    writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+    await writer.drain()
+
+
+async def serve(host: str = "127.0.0.1", port: int = 8787, unix: Optional[str] = None,
+                workers: Optional[int] = None, max_batch: int = 64, max_wait_ms: float = 2.0,
+                max_queue: int = 4096, max_body: int = 1 << 20) -> None:
+    workers = workers or os.cpu_count() or 1
+    loop = asyncio.get_running_loop()
+    with make_pool(workers) as pool:
+        # one batch per worker in flight, and one more being filled
+        batcher = MicroBatcher(pool, max_batch, max_wait_ms / 1000.0, max_queue, max_inflight=workers + 1)
+        service = DetectionService(batcher, max_body=max_body)
+        await batcher.ask_ruleset()
+        batcher.start()
+        if unix:
+            server = await asyncio.start_unix_server(service.handle_connection, path=unix)
+            where = unix
+        else:
+            server = await asyncio.start_server(service.handle_connection, host, port)
+            where = f"http://{host}:{port}"
+        stop = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except (NotImplementedError, RuntimeError):  # not on this platform / thread
+                pass
+        print(f"serving on {where} ({workers} workers, batch <= {max_batch}, wait <= {max_wait_ms} ms)",
+              file=sys.stderr, flush=True)
+        async with server:
+            await stop.wait()
+        await batcher.stop()
+        if unix and os.path.exists(unix):
+            os.unlink(unix)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--unix", default=None, help="listen on this Unix socket instead of TCP")
+    parser.add_argument("--workers", type=int, default=None, help="detection processes (default: all cores)")
+    parser.add_argument("--max-batch", type=int, default=64, help="texts per micro-batch")
+    parser.add_argument("--max-wait-ms", type=float, default=2.0, help="how long a batch waits to fill")
+    parser.add_argument("--max-queue", type=int, default=4096, help="queued texts before answering 503")
+    parser.add_argument("--max-body", type=int, default=1 << 20, help="largest request body in bytes")
+    args = parser.parse_args(argv)
+    asyncio.run(serve(args.host, args.port, args.unix, args.workers, args.max_batch,
+                      args.max_wait_ms, args.max_queue, args.max_body))
+
+
+if __name__ == "__main__":
+    main()
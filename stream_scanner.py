@@ -0,0 +1,250 @@
+# stream_scanner.py
+"""Incremental detection for text that arrives in pieces (LLM output, typed input).
+
+    scanner = StreamScanner()
+    for token in response:
+        if scanner.feed(token).blocked:
+            break                       # cut the response off here
+    result = scanner.finish()           # DetectionResult for everything fed
+
+    scanner = StreamScanner(policy=Policy("bank", block=90, flag=50))   # a tenant's policy
+
+    python stream_scanner.py --chunk 4 --limit 2000    # agreement with detect() on the parquet
+
+Re-running normalize_and_detect on the growing buffer costs O(n^2) over a response.
+StreamScanner instead scores each piece of text once. Fed text waits in a pending
+buffer until it can be committed at a safe cut: whitespace that does not split a
+word (so a base64 / hex candidate is never halved), a run of one-character tokens
+("i g n o r e" may still grow) or an open '<' tag. Committed segments are scored
+like normalize_and_detect scores a text:
+
+  keywords   per word, so segment scores simply add up
+  arabic     an Aho-Corasick state carried from chunk to chunk; runs on every chunk
+             as it arrives, so a trigger blocks even before its segment is committed
+  intent     rules fire per segment, plus once on a seam window of `overlap` chars
+             either side of every cut for matches that cross it
+
+The RuleSet current when the scanner is created (or the one passed in) scores the
+whole stream, even if normalizer.reload_rules() swaps in another one meanwhile.
+The policy works as in detect(): its weights apply to that RuleSet, and the running
+score is capped and decided by it. The result differs from a single detect() call
+under the same rules and policy only where a rule needs more context than one
+segment plus its seams (an unbounded gap longer than `overlap`, markup spanning a cut).
+"""
+import argparse
+import sys
+from collections import Counter
+from typing import List, Optional, Tuple
+
+import normalizer
+from normalizer import DEFAULT_POLICY, PER_MATCH_INTENTS, WINDOW_CHARS, DetectionResult, Policy, RuleSet
+
+FLUSH_CHARS = 256
+OVERLAP = 256
+
+
+class StreamScanner:
+    """Running prompt-injection score over a text fed chunk by chunk. Not thread-safe.
+
+    flush_chars is how much pending text triggers a commit (smaller reacts sooner,
+    larger runs the pipeline less often); max_pending bounds the pending buffer when
+    no safe cut shows up (one endless token), at the price of a hard cut. rules and
+    policy are those of normalizer.detect.
+    """
+
+    def __init__(self, flush_chars: int = FLUSH_CHARS, overlap: int = OVERLAP,
+                 max_pending: int = WINDOW_CHARS, rules: Optional[RuleSet] = None,
+                 policy: Policy = DEFAULT_POLICY):
+        if not 0 < flush_chars <= max_pending:
+            raise ValueError("flush_chars must be positive and at most max_pending")
+        self.flush_chars = flush_chars
+        self.overlap = overlap
+        self.max_pending = max_pending
+        # the Arabic automaton state is only valid for these rules
+        self._rules = rules or normalizer.current_rules()
+        if policy.weights:  # rules itself when they already carry these weights
+            self._rules = self._rules.with_weights(policy.weights)
+        self.policy = policy
+        self._pending = ""
+        self._next_try = flush_chars       # pending length at which to look for a cut again
+        self._tail = ""                    # last `overlap` committed chars, for seams
+        self._texts: List[str] = []        # normalized segments
+        self._keyword_score = 0
+        self._keyword_hits: dict = {}      # distinct (word, keyword, kind) hits
+        self._intent_once: dict = {}       # once-per-text intent rules, in firing order
+        self._intent_counts: Counter = Counter()  # per-match intent rules
+        self._arabic_hits: set = set()
+        self._arabic_state = 0
+        self._result: Optional[DetectionResult] = None
+        self.fed = 0                       # characters fed so far
+        self.finished = False
+
+    # --- public API ---
+    def feed(self, chunk: str) -> DetectionResult:
+        """Add the next piece of text; returns the running result.
+
+        Once the result is BLOCKED it stays BLOCKED (every rule only adds to the
+        score), and further chunks are not scored.
+        """
+        if self.finished:
+            raise ValueError("feed() after finish()")
+        if self._result is not None and self._result.blocked:
+            return self._result
+        self.fed += len(chunk)
+        hits, self._arabic_state = normalizer.scan_arabic_keywords(chunk, self._arabic_state, self._rules)
+        if not hits <= self._arabic_hits:
+            self._arabic_hits |= hits
+            self._result = None
+        self._pending += chunk
+        if len(self._pending) >= self._next_try:
+            cut = self._safe_cut(self._pending)
+            if cut:
+                self._commit(self._pending[:cut])
+                self._pending = self._pending[cut:]
+                self._result = None
+                self._next_try = self.flush_chars
+            else:  # wait for another flush_chars before scanning the buffer again
+                self._next_try = len(self._pending) + self.flush_chars
+        return self.result()
+
+    def finish(self) -> DetectionResult:
+        """Commit whatever is pending; the result for the whole stream."""
+        if not self.finished:
+            self.finished = True
+            if self._pending and not (self._result is not None and self._result.blocked):
+                self._commit(self._pending)
+            self._pending = ""
+            self._result = None
+        return self.result()
+
+    @property
+    def blocked(self) -> bool:
+        return self.result().blocked
+
+    def result(self) -> DetectionResult:
+        if self._result is None:
+            weights = self._rules.intent_weights
+            intent_score = sum(weights[name] for name in self._intent_once)
+            intent_score += sum(weights[name] * n for name, n in self._intent_counts.items())
+            total = (intent_score + normalizer.arabic_trigger_score(self._arabic_hits, self._rules)
+                     + self._keyword_score)
+            score = min(total, self.policy.cap)
+            intent_hits = list(self._intent_once) + list(self._intent_counts)
+            self._result = DetectionResult(' '.join(self._texts), score, self.policy.decide(score), None,
+                                           intent_hits, tuple(self._keyword_hits), frozenset(self._arabic_hits),
+                                           (), self._rules.version)
+        return self._result
+
+    # --- internals ---
+    def _safe_cut(self, text: str) -> int:
+        """End of the longest prefix of text that later chunks cannot change; 0 for none."""
+        cut = len(text)
+        while cut and not text[cut - 1].isspace():  # the last word may still grow
+            cut -= 1
+        # a trailing run of one-character tokens may be a split word that is not done yet
+        while cut:
+            end = cut
+            while end and text[end - 1].isspace():
+                end -= 1
+            start = end
+            while start and not text[start - 1].isspace():
+                start -= 1
+            if end - start != 1:
+                break
+            cut = start
+        # an unclosed tag (attributes may hold spaces) stays pending as a whole
+        lt = text.rfind('<', 0, cut)
+        if lt != -1 and text.rfind('>', 0, cut) < lt:
+            cut = lt
+            while cut and not text[cut - 1].isspace():
+                cut -= 1
+        if cut == 0 and len(text) >= self.max_pending:
+            return self.max_pending  # no safe cut in sight: bound the buffer
+        return cut
+
+    def _commit(self, segment: str) -> None:
+        intent_hits: list = []
+        sanitized, _ = normalizer.sanitize_malicious_code_intent(segment, intent_hits, self._rules)
+        aggressive = normalizer.aggressive_clean(segment)
+        text = normalizer.normalize_text(sanitized, rules=self._rules)
+        if text:
+            self._texts.append(text)
+        hits: list = []
+        self._keyword_score += normalizer.score_keywords(text.lower() + " " + aggressive, hits, self._rules)
+        self._keyword_hits.update(dict.fromkeys(hits))
+        self._add_intent(intent_hits)
+        if self._tail:
+            self._add_intent(self._crossing(self._tail, segment[:self.overlap]))
+        self._tail = (self._tail + segment)[-self.overlap:]
+
+    def _add_intent(self, names) -> None:
+        for name in names:
+            if name in PER_MATCH_INTENTS:
+                self._intent_counts[name] += 1
+            else:
+                self._intent_once[name] = None
+
+    def _crossing(self, left: str, right: str) -> List[str]:
+        # intent matches of the seam that neither side has on its own
+        seam: list = []
+        normalizer.sanitize_malicious_code_intent(left + right, seam, self._rules)
+        if not seam:
+            return []
+        sides: list = []
+        normalizer.sanitize_malicious_code_intent(left, sides, self._rules)
+        normalizer.sanitize_malicious_code_intent(right, sides, self._rules)
+        counts = Counter(seam)
+        counts.subtract(sides)
+        out = [name for name in dict.fromkeys(seam) if name not in PER_MATCH_INTENTS]
+        for name in PER_MATCH_INTENTS:
+            out += [name] * max(counts[name], 0)
+        return out
+
+
+def scan_stream(chunks, **options) -> Tuple[DetectionResult, int]:
+    """Feed chunks until BLOCKED or exhausted: (final result, characters fed)."""
+    scanner = StreamScanner(**options)
+    for chunk in chunks:
+        if scanner.feed(chunk).blocked:
+            break
+    return scanner.finish(), scanner.fed
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--dataset", default="data/translated_data_clean_10.parquet")
+    parser.add_argument("--limit", type=int, default=0)
+    parser.add_argument("--chunk", type=int, default=4, help="characters per fed chunk")
+    parser.add_argument("--min-agreement", type=float, default=0.99,
+                        help="exit 1 when fewer decisions than this agree with detect()")
+    args = parser.parse_args(argv)
+
+    import pandas as pd
+
+    texts = [t if isinstance(t, str) else "" for t in pd.read_parquet(args.dataset, columns=["text"])["text"]]
+    if args.limit:
+        texts = texts[: args.limit]
+    # the default policy, and one with its own thresholds and weights
+    policies = (DEFAULT_POLICY, Policy("strict", block=90, flag=50, weights={"intent:jailbreak": 120}))
+    failed = False
+    for policy in policies:
+        agree = exact = early = 0
+        saved = 0
+        for text in texts:
+            expected = normalizer.detect(text, policy=policy)
+            got, fed = scan_stream((text[i:i + args.chunk] for i in range(0, len(text), args.chunk)),
+                                   policy=policy)
+            agree += got.decision == expected.decision
+            exact += got.score == expected.score
+            if got.blocked and fed < len(text):
+                early += 1
+                saved += len(text) - fed
+        n = max(len(texts), 1)
+        print(f"{policy.name}: {len(texts)} texts in {args.chunk}-char chunks: decision agrees {agree / n:.2%}, "
+              f"score identical {exact / n:.2%}; {early} blocked mid-stream, {saved} chars never fed")
+        failed |= agree / n < args.min_agreement
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())